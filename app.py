@@ -1,100 +1,176 @@
 from htmltools.tags import footer
-import plotly.express as px
-import enerhabitat as eh
 import pandas as pd
 
+import asyncio
+import contextlib
 import os
+import threading
+import time
 from datetime import date
 
 from shiny import App, ui, render, reactive
-from shinywidgets import output_widget, render_widget
+from starlette.applications import Starlette
+from starlette.routing import Mount
 
 from utils.card import (
     init_sistemas,
     side_card,
-    sc_paneles,
-    build_img_uri,
+    barrido_card,
+    tabla_card,
+    sc_panel,
+    capa_panel,
+    titulo_capa,
     PRECARGADOS_DIR,
+    IMG_DIR,
+    LOGO,
     MAX_CAPAS,
+    MAX_SC,
+    meses,
 )
 
-from utils.extraer import get_git_info
+from utils.api import rutas as api_rutas
+from utils.cache import dia_promedio, estadisticas
+from utils.ingesta import ingerir_epw
+from utils.motor import (
+    resolver_sistemas_async,
+    precargar_dias_async,
+    trabajos_previos,
+    RESOLUCIONES,
+    NX_PREVIA,
+)
+from utils.graficas import GraficaSeries
+from utils import exportar, trazas
+from utils.resultado import Resultado, vistas_compartidas, pagina, FILAS_PAGINA
+from utils.memoria import presupuesto, barrer_periodicamente
+from utils.anual import trabajos_anuales, tabla_mensual, resumen_anual, con_aire
+from utils.barrido import (
+    EJES,
+    METRICAS,
+    rango,
+    generar_trabajos,
+    tabla_barrido,
+    matriz_barrido,
+)
 from pathlib import Path
 
-commit_hash, branch = get_git_info(short=True)
+commit_hash, branch = trazas.build()
 message_md = Path(__file__).parent / "message.md"
-message_content = ui.markdown(message_md.read_text(encoding="utf-8"))
 build_text = f"{commit_hash} ({branch})"
 
+# Panel de diagnóstico con los tiempos por etapa (también en GET /metrics)
+DEBUG = os.environ.get("EH_DEBUG") == "1"
+# Importar en segundo plano, al arrancar, lo que la primera sesión necesita
+PRECALENTAR = os.environ.get("EH_PRECALENTAR", "1") == "1"
+
 footer_tag = ui.tags.footer(
     ui.hr(),
     ui.tags.small(build_text),
     class_="container-fluid py-2 text-muted"
 )
 
-# Configuración de Ener-Habitat
-eh.config.Nx = 200
-
-app_ui = ui.page_fluid(
-    ui.modal(
-        message_content,
-        title="EnerHabitat V0.9.0",
-        easy_close=True,
-        footer=footer_tag,
-    ),
-    ui.page_navbar(
-        ui.nav_panel(
-            "EnerHabitat",
-            ui.page_sidebar(
-                ui.sidebar(
-                    side_card(),
-                    id="sidebar",
-                    width=350,
-                    # position="right",
+
+def construir_ui():
+    # shinywidgets trae ipywidgets; se importa con la primera página, no al arrancar
+    from shinywidgets import output_widget
+
+    message_content = ui.markdown(message_md.read_text(encoding="utf-8"))
+    return ui.page_fluid(
+        ui.modal(
+            message_content,
+            title="EnerHabitat V0.9.0",
+            easy_close=True,
+            footer=footer_tag,
+        ),
+        ui.page_navbar(
+            ui.nav_panel(
+                "EnerHabitat",
+                ui.page_sidebar(
+                    ui.sidebar(
+                        side_card(),
+                        id="sidebar",
+                        width=350,
+                        # position="right",
+                    ),
+                    ui.output_ui("ui_graficas_eh"),
                 ),
-                ui.output_ui("ui_graficas_eh"),
             ),
-        ),
-        ui.nav_panel(
-            "Métricas",
-            ui.output_ui("ui_metricas"),
-        ),
-        ui.nav_panel(
-            "Resultados",
-            ui.output_ui("ui_dataframes"),
-        ),
-        title=ui.tags.img(
-                src=build_img_uri("icono-EnerHabitat.png"),
-                alt="EnerHabitat",
-                style="height: 40px;"
+            ui.nav_panel(
+                "Métricas",
+                ui.output_ui("ui_metricas"),
             ),
-    ),
-    footer="Hola mundo"
-)
+            ui.nav_panel(
+                "Resultados",
+                ui.layout_sidebar(
+                    ui.sidebar(
+                        tabla_card(),
+                        width=300,
+                    ),
+                    ui.output_ui("ui_dataframes"),
+                ),
+            ),
+            ui.nav_panel(
+                "Anual",
+                ui.output_ui("ui_anual"),
+            ),
+            ui.nav_panel(
+                "Barrido",
+                ui.layout_sidebar(
+                    ui.sidebar(
+                        barrido_card(),
+                        width=350,
+                    ),
+                    ui.card(ui.card_header("Barrido paramétrico"), output_widget("barrido_plot")),
+                ),
+            ),
+            *([ui.nav_panel(
+                "Diagnóstico",
+                ui.card(ui.card_header("Build"), ui.tags.code(build_text)),
+                ui.card(ui.card_header("Tiempos por etapa"), ui.output_data_frame("diagnostico_etapas")),
+                ui.card(ui.card_header("Cachés"), ui.output_data_frame("diagnostico_caches")),
+                ui.card(ui.card_header("Memoria por sesión"), ui.output_data_frame("diagnostico_memoria")),
+            )] if DEBUG else []),
+            title=ui.tags.img(
+                    src=LOGO,
+                    alt="EnerHabitat",
+                    style="height: 40px;"
+                ),
+        ),
+        footer="Hola mundo"
+    )
+
+
+_ui = None
+
+
+def app_ui(request):
+    """La interfaz se construye con la primera petición y se reutiliza."""
+    global _ui
+    if _ui is None:
+        _ui = construir_ui()
+    return _ui
 
 
 def server(input, output, session):
+    from shinywidgets import output_widget, render_widget
+
     # Definición de variables "globales" para la app
     locacion = reactive.Value(None)
     dia_promedio_dataframe = reactive.Value(pd.DataFrame())
-    soluciones_dataframe = reactive.Value(pd.DataFrame())
+    # Resultado del último cálculo (series, métricas, modo de AC); inmutable
+    resultado = reactive.Value(Resultado())
     current_file = reactive.Value(None)
 
-    aire_simulacion = reactive.Value(None)
-    metricas = reactive.Value(pd.DataFrame())
+    anual_mensual = reactive.Value(pd.DataFrame())
     
-    # Diccionario para datos de cada sistema constructivo
-    sistemas = reactive.Value(init_sistemas())
+    # Estado de cada sistema constructivo, un valor reactivo por sistema
+    # (editar un sistema no invalida lo que depende de los demás)
+    sistemas = {sc_id: reactive.Value(sistema) for sc_id, sistema in init_sistemas().items()}
     """
     sc_id : {
         absortancia,
         capas_activas,
         capa_abierta,
         capas: {capa_id: material, ancho}
-        FD,
-        FDsa,
-        TR,
-        ET
     }"""
     
     """
@@ -103,22 +179,286 @@ def server(input, output, session):
     ================================
     """
     # Recalcular meanDay cuando cambie el EPW o el mes
+    # (Location y meanDay vienen de la caché compartida entre sesiones).
+    # Un meanDay que no está en caché tarda (pvlib): se calcula en un hilo
+    # como tarea extendida para no detener el event loop de las demás sesiones.
     @reactive.Effect
     def update_meanDay():
         file = current_file.get()
         if file is not None:
-            current_location = eh.Location(epw_file=file)
-            df = current_location.meanDay(month=input.mes())
+            tarea_meanDay(file, input.mes())
+
+    @reactive.extended_task
+    async def tarea_meanDay(file, mes):
+        with trazas.medir("update_meanDay"):
+            return await asyncio.to_thread(dia_promedio, file, mes)
+
+    @reactive.Effect
+    def publicar_meanDay():
+        status = tarea_meanDay.status()
+        if status == "error":
+            ui.notification_show(f"No se pudo calcular el día promedio: {tarea_meanDay.error.get()}", type="error")
+        elif status == "success":
+            current_location, df = tarea_meanDay.result()
             locacion.set(current_location)
             dia_promedio_dataframe.set(df)
 
     # Resolver sistemas constructivos
+    # La simulación corre como tarea extendida: el event loop (y las demás
+    # sesiones) siguen atendiendo mientras el motor resuelve los sistemas.
     @reactive.Effect
     @reactive.event(input.resolver_sc) # Solo se ejecuta cuando se presiona el botón resolver_sc
     def calculate_solucion():
         num_sc = input.num_sc()
         aire = bool(int(input.aire_acondicionado()))
-        
+
+        # Un trabajo por sistema constructivo
+        trabajos = []
+        etiquetas = []
+        for sc_id in range(1, num_sc + 1):
+            trabajos.append({
+                "sc_id": sc_id,
+                "epw": current_file.get(),
+                "mes": input.mes(),
+                "tilt": float(input.tilt()),
+                "azimuth": float(input.azimuth()),
+                "absortancia": float(input[f"absortancia_{sc_id}"]()),
+                "capas": sistemaConstructivo(sc_id),
+                "aire": aire,
+                "Nx": RESOLUCIONES[input.resolucion()],
+            })
+            etiquetas.append(sistemaConstructivo_str(sc_id))
+
+        # Los 12 meses: un trabajo por (mes, sistema) con sc_id propio
+        anual = None
+        if input.todos_meses():
+            trabajos_mes = trabajos
+            trabajos, indice = trabajos_anuales(trabajos_mes)
+            anual = {"indice": indice, "mes": input.mes(), "trabajos_mes": trabajos_mes}
+            anual_mensual.set(pd.DataFrame())
+
+        progreso = ui.Progress(min=1, max=len(trabajos) + 2)
+        progreso.set(message="Calculando...", detail="Cargando datos", value=1)
+        tarea_solucion(trabajos, etiquetas, aire, progreso, anual)
+
+    @ui.bind_task_button(button_id="resolver_sc")
+    @reactive.extended_task
+    async def tarea_solucion(trabajos, etiquetas, aire, progreso, anual=None):
+        inicio = time.perf_counter()
+        try:
+            if anual is not None:
+                return await resolver_anual(trabajos, etiquetas, aire, progreso, anual)
+
+            # Sólo se resuelven los sistemas que cambiaron desde el último cálculo
+            reutilizados, cambiados = separar_cambiados(trabajos)
+            progreso.set(value=progreso.value + len(reutilizados))
+
+            # Vista previa con Nx reducido mientras se resuelve a resolución completa
+            previos = await asyncio.to_thread(trabajos_previos, cambiados)
+            if previos:
+                progreso.set(detail="Vista previa", value=progreso.value)
+                # La vista previa no pasa por la caché: no cuenta en su hit rate
+                # ni desplaza de la LRU a los resultados a resolución completa
+                resultados = unir(reutilizados, await resolver_sistemas_async(previos, usar_cache=False))
+                trabajos_previa = sorted(
+                    previos + [t for t in trabajos if t["sc_id"] in reutilizados], key=lambda t: t["sc_id"]
+                )
+                resultados_df, metricas_df = armar_resultados(trabajos_previa, etiquetas, resultados)
+                await publicar_ahora((resultado, Resultado(
+                    resultados_df, metricas_df, aire, provisional=True, metadatos=exportar.metadatos(trabajos_previa, resultados)
+                )))
+
+            # El progreso avanza conforme terminan los sistemas
+            def avance(resultado):
+                progreso.set(
+                    detail=f"Sistema Constructivo {resultado['sc_id']} resuelto",
+                    value=progreso.value + 1,
+                )
+
+            nuevos = await resolver_sistemas_async(cambiados, avance=avance) if cambiados else []
+            resultados = unir(reutilizados, nuevos)
+            recordar(trabajos, resultados)
+            resultados_df, metricas_df = armar_resultados(trabajos, etiquetas, resultados)
+            progreso.set(detail="Completo :D", value=progreso.value + 1)
+            return {"resultado": Resultado(
+                resultados_df, metricas_df, aire, metadatos=exportar.metadatos(trabajos, resultados)
+            )}
+        finally:
+            progreso.close()
+            trazas.registrar("calculate_solucion", time.perf_counter() - inicio)
+
+    # Corrida de los 12 meses: cada mes se publica en la pestaña Anual en
+    # cuanto terminan todos sus sistemas, sin esperar a los demás meses.
+    async def resolver_anual(trabajos, etiquetas, aire, progreso, anual):
+        indice = anual["indice"]
+        por_mes = {}
+        for mes, _ in indice.values():
+            por_mes[mes] = por_mes.get(mes, 0) + 1
+        terminados = {}
+        publicaciones = []  # Referencias a las tareas para que no se recolecten
+
+        def avance(resultado):
+            mes, sc_id = indice[resultado["sc_id"]]
+            progreso.set(detail=f"{meses[mes]}: SC {sc_id} resuelto", value=progreso.value + 1)
+            terminados.setdefault(mes, []).append(resultado)
+            if len(terminados[mes]) == por_mes[mes]:
+                completos = [r for m in terminados if len(terminados[m]) == por_mes[m] for r in terminados[m]]
+                publicaciones.append(asyncio.ensure_future(
+                    publicar_ahora((anual_mensual, tabla_mensual(indice, completos, etiquetas)))
+                ))
+
+        progreso.set(detail="Calculando los días promedio de los 12 meses", value=progreso.value)
+        await precargar_dias_async(trabajos)
+        resultados = await resolver_sistemas_async(trabajos, avance=avance)
+        # Ninguna tabla parcial debe llegar después de la completa (ni perder sus errores)
+        await asyncio.gather(*publicaciones)
+
+        # Las pestañas de siempre muestran el mes seleccionado
+        del_mes = [
+            dict(r, sc_id=indice[r["sc_id"]][1])
+            for r in resultados
+            if indice[r["sc_id"]][0] == anual["mes"]
+        ]
+        recordar(anual["trabajos_mes"], del_mes)
+        resultados_df, metricas_df = armar_resultados(anual["trabajos_mes"], etiquetas, del_mes)
+        progreso.set(detail="Completo :D", value=progreso.value + 1)
+        return {
+            "resultado": Resultado(
+                resultados_df, metricas_df, aire, metadatos=exportar.metadatos(anual["trabajos_mes"], del_mes)
+            ),
+            "anual": tabla_mensual(indice, resultados, etiquetas),
+        }
+
+    # Último trabajo y resultado a resolución completa de cada sistema. Un
+    # sistema cuyo trabajo (EPW, mes, orientación, absortancia, capas, AC y
+    # Nx) no cambió reutiliza su resultado sin consultar el motor.
+    ultimos = {}
+
+    def separar_cambiados(trabajos):
+        """Regresa ({sc_id: resultado} de los que no cambiaron, [trabajos que cambiaron])."""
+        reutilizados = {}
+        cambiados = []
+        for trabajo in trabajos:
+            anterior = ultimos.get(trabajo["sc_id"])
+            if anterior is not None and anterior[0] == trabajo:
+                reutilizados[trabajo["sc_id"]] = anterior[1]
+            else:
+                cambiados.append(trabajo)
+        return reutilizados, cambiados
+
+    def recordar(trabajos, resultados):
+        por_sc = {r["sc_id"]: r for r in resultados}
+        for trabajo in trabajos:
+            ultimos[trabajo["sc_id"]] = (trabajo, por_sc[trabajo["sc_id"]])
+
+    def unir(reutilizados, nuevos):
+        """Resultados reutilizados y recién resueltos, en orden de sc_id."""
+        return sorted([*reutilizados.values(), *nuevos], key=lambda r: r["sc_id"])
+
+    @reactive.Effect
+    @reactive.event(input.cancelar_sc)
+    def cancelar_solucion():
+        tarea_solucion.cancel()
+
+    # Publica valores desde una tarea en curso sin esperar a que termine
+    async def publicar_ahora(*pares):
+        async with reactive.lock():
+            for valor, dato in pares:
+                valor.set(dato)
+            await reactive.flush()
+
+    # Presupuesto de memoria: los resultados de la sesión se cuentan y, si
+    # quedan inactivos o se pasa del límite, el barrido del proceso (arranque)
+    # suelta sus vistas memorizadas
+    @reactive.Effect
+    def registrar_resultado():
+        presupuesto.registrar(session.id, resultado.get())
+
+    session.on_ended(lambda: presupuesto.cerrar(session.id))
+
+    # Último resultado a resolución completa: si el cálculo se cancela o falla
+    # después de publicar la vista previa, vuelve a mostrarse en su lugar
+    ultimo_completo = Resultado()
+
+    # Publicar los resultados juntos cuando la tarea termina
+    @reactive.Effect
+    def publicar_solucion():
+        nonlocal ultimo_completo
+        status = tarea_solucion.status()
+        if status == "cancelled":
+            resultado.set(ultimo_completo)
+            ui.notification_show("Cálculo cancelado; se conserva el resultado anterior", type="warning")
+            return
+        if status == "error":
+            resultado.set(ultimo_completo)
+            ui.notification_show(f"Error al calcular: {tarea_solucion.error.get()}", type="error")
+            return
+        if status != "success":
+            return
+        salida = tarea_solucion.result()
+        ultimo_completo = salida["resultado"]
+        resultado.set(ultimo_completo)
+        if "anual" in salida:
+            anual_mensual.set(salida["anual"])
+
+    """
+    ================================
+          Barrido paramétrico
+    ================================
+    """
+    @reactive.Effect
+    @reactive.event(input.barrido_calcular)
+    def calculate_barrido():
+        sc_id = int(input.barrido_sc())
+        seleccion = input.barrido_ejes()
+
+        ejes = {}
+        if "ancho" in seleccion:
+            ejes["ancho"] = rango(*input.barrido_ancho(), input.barrido_ancho_pasos())
+        if "absortancia" in seleccion:
+            ejes["absortancia"] = rango(*input.barrido_absortancia(), input.barrido_absortancia_pasos(), decimales=2)
+        if "material" in seleccion:
+            ejes["material"] = list(input.barrido_materiales())
+
+        base = {
+            "epw": current_file.get(),
+            "mes": input.mes(),
+            "tilt": float(input.tilt()),
+            "azimuth": float(input.azimuth()),
+            "absortancia": float(sistemas[sc_id].get()["absortancia"]),
+            "capas": sistemaConstructivo(sc_id),
+            "aire": bool(int(input.aire_acondicionado())),
+            "Nx": RESOLUCIONES[input.resolucion()],
+        }
+
+        try:
+            celdas, trabajos = generar_trabajos(base, input.barrido_capa(), ejes)
+        except ValueError as error:
+            ui.notification_show(str(error), type="error")
+            return
+
+        progreso = ui.Progress(min=0, max=len(trabajos))
+        progreso.set(message="Calculando barrido...", detail=f"{len(trabajos)} combinaciones", value=0)
+        tarea_barrido(celdas, trabajos, progreso)
+
+    @ui.bind_task_button(button_id="barrido_calcular")
+    @reactive.extended_task
+    async def tarea_barrido(celdas, trabajos, progreso):
+        try:
+            resultados = await resolver_sistemas_async(
+                trabajos, avance=lambda r: progreso.set(value=progreso.value + 1)
+            )
+            return tabla_barrido(celdas, resultados)
+        finally:
+            progreso.close()
+
+    """
+    ================================
+          Funciones auxiliares          
+    ================================
+    """
+    # Une las soluciones del motor en el DataFrame de resultados y la tabla de métricas
+    def armar_resultados(trabajos, etiquetas, resultados):
         cm_sistema = []
         cm_absortancia = []
         cm_FD = []
@@ -128,112 +468,69 @@ def server(input, output, session):
         cm_Eenf = []
         cm_Ecal = []
         cm_Etotal = []
+        cm_Timax = []
+        cm_Hconf = []
+        cm_GHsup = []
+        cm_GHinf = []
+        cm_Nx = []
+        cm_tiempo = []
+
+        # Agregar info de clima una sola vez y columnas con sufijo por sistema
+        resultados_df = resultados[0]["clima"]
+        for trabajo, etiqueta, resultado in zip(trabajos, etiquetas, resultados):
+            sc_id = resultado["sc_id"]
+            solve_df = resultado["solucion"].add_suffix(f"_{sc_id}")
+            resultados_df = resultados_df.join(solve_df, how="right")
+
+            # Current metrics
+            m = resultado["metricas"]
+            cm_sistema.append(etiqueta)
+            cm_absortancia.append(trabajo["absortancia"])
+            cm_Eenf.append(m["Eenf"])
+            cm_Ecal.append(m["Ecal"])
+            cm_Etotal.append(m["Etotal"])
+            cm_FD.append(m["FD"])
+            cm_FDsa.append(m["FDsa"])
+            cm_TR.append(m["TR"])
+            cm_ET.append(m["ET"])
+            cm_Timax.append(m["Timax"])
+            cm_Hconf.append(m["Hconf"])
+            cm_GHsup.append(m["GHsup"])
+            cm_GHinf.append(m["GHinf"])
+            cm_Nx.append(resultado["Nx"])
+            cm_tiempo.append(resultado["tiempo"])
+
+        met = {"SC\n[material : m]" : cm_sistema,
+                "a\n[-]": cm_absortancia,
+                "Eenf\n[Wh/m²]": cm_Eenf,
+                "Ecal\n[Wh/m²]": cm_Ecal,
+                "Etotal\n[Wh/m²]": cm_Etotal,
+                "FD\n[-]": cm_FD,
+                "FDsa\n[-]": cm_FDsa,
+                "TR\n[HH:MM]": cm_TR,
+                "ET\n[Wh/m²]": cm_ET,
+                "Ti máx\n[°C]": cm_Timax,
+                "Confort\n[h]": cm_Hconf,
+                "GH sobre\n[°C·h]": cm_GHsup,
+                "GH bajo\n[°C·h]": cm_GHinf,
+                "Nx\n[-]": cm_Nx,
+                "t\n[s]": cm_tiempo,
+                }
+        metricas_df = pd.DataFrame(met).round(3)
+        return resultados_df, metricas_df
 
-        with ui.Progress(min=1, max=num_sc * 2 + 2) as progreso:
-            progreso.set(message="Calculando...", detail="Cargando datos", value=1)    
-            
-            current_location = locacion.get()
-            resultados_df = pd.DataFrame()
-            
-            current_system = eh.System(location=current_location)
-                     
-            for sc_id in range(1, num_sc + 1):
-                progreso.set(detail=f"Tsa Sistema Constructivo {sc_id}", value=progreso.value + 1)
-                
-                # Current values
-                c_absortancia = float(input[f"absortancia_{sc_id}"]())
-                c_tilt = float(input.tilt())
-                c_azimuth = float(input.azimuth())
-                
-                # Sistema constructivo
-                c_sistema_const = sistemaConstructivo(sc_id)
-            
-                # Actualizar current_system values
-                current_system.tilt=c_tilt
-                current_system.azimuth=c_azimuth
-                current_system.absortance=c_absortancia
-                current_system.layers=c_sistema_const
-                
-                # Current metrics
-                cm_sistema.append(sistemaConstructivo_str(sc_id))
-                cm_absortancia.append(c_absortancia)
-                
-                # Resolver para este sistema constructivo
-                progreso.set(detail=f"Ti Sistema Constructivo {sc_id}", value=progreso.value + 1)
-            
-                # Solución y métricas dependiendo de AC
-                if aire==True:
-                    solve_df = current_system.solveAC()
-                    Qcool = current_system.cooling_energy
-                    Qheat = current_system.heating_energy
-                    cm_Eenf.append(Qcool)
-                    cm_Ecal.append(Qheat)
-                    cm_Etotal.append(Qcool+Qheat)
-                    cm_ET.append(None)
-                else:
-                    solve_df = current_system.solve()
-                    cm_Eenf.append(None)
-                    cm_Ecal.append(None)
-                    cm_Etotal.append(None)
-                    cm_ET.append(current_system.energy_transfer)
-
-                Tsa_df = current_system.Tsa()
-                # Crear subconjunto con Is, Tsa y Ti
-                solve_df = Tsa_df[["Tsa"]].join(solve_df, how="right")
-
-                # Calcular métricas
-                deltaTi = solve_df.Ti.max() - solve_df.Ti.min()
-                
-                cm_FD.append(deltaTi/(Tsa_df.Ta.max() - Tsa_df.Ta.min()))
-                cm_FDsa.append(deltaTi/(Tsa_df.Tsa.max() - Tsa_df.Tsa.min()))
-                
-                Tr_comp =(solve_df.Ti.idxmax() - Tsa_df.Ta.idxmax()).components
-                cm_TR.append(f"{Tr_comp.hours:02}:{Tr_comp.minutes:02}")
-
-                # Agregar info de Tsa solo la primera vez
-                if sc_id == 1:
-                    resultados_df = Tsa_df[["Tn", "DeltaTn", "Ta", "Ig", "Ib", "Id", "Is"]]
-
-                # Agregar columnas con sufijo
-                solve_df = solve_df.add_suffix(f"_{sc_id}")
-                resultados_df = resultados_df.join(solve_df, how="right")
-            
-            met = {"SC\n[material : m]" : cm_sistema,
-                    "a\n[-]": cm_absortancia,
-                    "Eenf\n[Wh/m²]": cm_Eenf,
-                    "Ecal\n[Wh/m²]": cm_Ecal,
-                    "Etotal\n[Wh/m²]": cm_Etotal,
-                    "FD\n[-]": cm_FD,
-                    "FDsa\n[-]": cm_FDsa,
-                    "TR\n[HH:MM]": cm_TR,
-                    "ET\n[Wh/m²]": cm_ET
-                    }
-            metricas_df = pd.DataFrame(met).round(3)
-
-            # Actualizar variables reactivas
-            # Set data first, then UI state to avoid race conditions
-            metricas.set(metricas_df)
-            soluciones_dataframe.set(resultados_df)
-            aire_simulacion.set(aire)
-            progreso.set(detail="Completo :D", value=progreso.value + 1)
-
-    """
-    ================================
-          Funciones auxiliares          
-    ================================
-    """
     # Regresa lista de tuplas de SC para el sc_id
     def sistemaConstructivo(sc_id):
-        capas = sistemas().get(sc_id)["capas"]
-        capas_activas = sistemas().get(sc_id)["capas_activas"]
+        capas = sistemas[sc_id]()["capas"]
+        capas_activas = sistemas[sc_id]()["capas_activas"]
         return [
             (capas[capa_id]["material"], capas[capa_id]["ancho"])
             for capa_id in range(1, capas_activas + 1)
         ]
 
     def sistemaConstructivo_str(sc_id):
-        capas = sistemas().get(sc_id)["capas"]
-        capas_activas = sistemas().get(sc_id)["capas_activas"]
+        capas = sistemas[sc_id]()["capas"]
+        capas_activas = sistemas[sc_id]()["capas_activas"]
         aux = []
         for capa_id in range(1, capas_activas + 1):
             material = capas[capa_id]["material"]
@@ -250,75 +547,120 @@ def server(input, output, session):
             file_path = os.path.join(PRECARGADOS_DIR, file_name)
             current_file.set(file_path)
 
-    # Manejar archivo subido
+    # Manejar archivo subido: se valida y guarda fuera del event loop y, si
+    # alguien ya subió el mismo archivo, se reutiliza sin volver a procesarlo
     @reactive.Effect
     def epw_upload():
         if input.selector_archivo() == "upload" and input.epw_file() is not None:
             file_info = input.epw_file()[0]
-            current_file.set(file_info["datapath"])  
-
-    # Actualizar capas_activas cuando cambia el número de SC
-    @reactive.Effect
-    def update_sistemas():
-        sc_id = int(input.sc_seleccionado().replace("SC ", ""))
-        paneles_abiertos = input[f"capas_accordion_{sc_id}"]()
-        current = sistemas.get().copy()
+            progreso = ui.Progress()
+            progreso.set(message="Procesando EPW...", detail=file_info["name"])
+            with reactive.isolate():
+                tarea_epw(file_info["datapath"], input.mes(), progreso)
 
-        current_open = current[sc_id]["capa_abierta"]
-
-        if paneles_abiertos is None or len(paneles_abiertos) == 0:
-            paneles_abiertos = current_open[sc_id]
-
-        else:
-            if current_open != paneles_abiertos[0]:
-                current_open = paneles_abiertos[0]
-                current[sc_id]["capa_abierta"] = current_open
-                sistemas.set(current)
-
-        capa_id = int(current_open.replace("capa_", ""))
-
-        updated = False
-
-        material_sistema = current[sc_id]["capas"][capa_id]["material"]
-        ancho_sistema = current[sc_id]["capas"][capa_id]["ancho"]
-
-        if input[f"material_capa_{sc_id}_{capa_id}"]() != material_sistema:
-            current[sc_id]["capas"][capa_id]["material"] = input[f"material_capa_{sc_id}_{capa_id}"]()
-            updated = True
-
-        if input[f"ancho_capa_{sc_id}_{capa_id}"]() != ancho_sistema:
-            current[sc_id]["capas"][capa_id]["ancho"] = input[f"ancho_capa_{sc_id}_{capa_id}"]()
-            updated = True
+    @reactive.extended_task
+    async def tarea_epw(datapath, mes, progreso):
+        try:
+            return await ingerir_epw(datapath, mes)
+        finally:
+            progreso.close()
 
-        if input[f"absortancia_{sc_id}"]() != current[sc_id]["absortancia"]:
-            current[sc_id]["absortancia"] = input[f"absortancia_{sc_id}"]()
-            updated = True
+    @reactive.Effect
+    def publicar_epw():
+        status = tarea_epw.status()
+        if status == "error":
+            ui.notification_show(f"No se pudo cargar el EPW: {tarea_epw.error.get()}", type="error")
+        elif status == "success":
+            current_file.set(tarea_epw.result())
+
+    # Editor de sistemas constructivos: el navset se construye una vez y cada
+    # cambio se aplica con ui.update_*/insert/remove sólo sobre lo que cambió.
+    # Cada capa y cada absortancia tienen su propio efecto, así que editar una
+    # capa no vuelve a leer las demás ni reconstruye el editor.
+    def actualizar_sistema(sc_id, **cambios):
+        with reactive.isolate():
+            actual = sistemas[sc_id].get()
+        sistemas[sc_id].set({**actual, **cambios})
+
+    def actualizar_capa(sc_id, capa_id, **cambios):
+        with reactive.isolate():
+            capas = sistemas[sc_id].get()["capas"]
+        capa = {**capas[capa_id], **cambios}
+        actualizar_sistema(sc_id, capas={**capas, capa_id: capa})
+        ui.update_accordion_panel(f"capas_accordion_{sc_id}", f"capa_{capa_id}", title=titulo_capa(capa_id, capa))
+
+    def vigilar_capa(sc_id, capa_id):
+        @reactive.effect
+        def _():
+            material = input[f"material_capa_{sc_id}_{capa_id}"]()
+            ancho = input[f"ancho_capa_{sc_id}_{capa_id}"]()
+            with reactive.isolate():
+                capa = sistemas[sc_id].get()["capas"][capa_id]
+            if (material, ancho) != (capa["material"], capa["ancho"]):
+                actualizar_capa(sc_id, capa_id, material=material, ancho=ancho)
+
+    def vigilar_sistema(sc_id):
+        @reactive.effect
+        def _():
+            absortancia = input[f"absortancia_{sc_id}"]()
+            with reactive.isolate():
+                if absortancia != sistemas[sc_id].get()["absortancia"]:
+                    actualizar_sistema(sc_id, absortancia=absortancia)
+
+        # Capa abierta en el acordeón, para reconstruir igual la pestaña
+        @reactive.effect
+        def _():
+            abiertos = input[f"capas_accordion_{sc_id}"]()
+            with reactive.isolate():
+                if abiertos and abiertos[0] != sistemas[sc_id].get()["capa_abierta"]:
+                    actualizar_sistema(sc_id, capa_abierta=abiertos[0])
+
+        for capa_id in range(1, MAX_CAPAS + 1):
+            vigilar_capa(sc_id, capa_id)
+
+    for sc_id in sistemas:
+        vigilar_sistema(sc_id)
+
+    # Pestañas visibles; al crecer se insertan sólo las nuevas con su estado
+    sc_mostrados = [1]
 
-        if updated:
-            sistemas.set(current)
+    @reactive.Effect
+    def update_num_sc():
+        num_sc = input.num_sc()
+        if not num_sc:
+            return
+        num_sc = max(1, min(MAX_SC, int(num_sc)))
+        with reactive.isolate():
+            for sc_id in range(sc_mostrados[0] + 1, num_sc + 1):
+                ui.insert_nav_panel("sc_seleccionado", sc_panel(sc_id, sistemas[sc_id].get()))
+            for sc_id in range(sc_mostrados[0], num_sc, -1):
+                ui.remove_nav_panel("sc_seleccionado", f"SC {sc_id}")
+            if sc_mostrados[0] > num_sc and sc_actual() > num_sc:
+                ui.update_navset("sc_seleccionado", selected=f"SC {num_sc}")
+            sc_mostrados[0] = num_sc
+
+    def sc_actual():
+        return int(input.sc_seleccionado().replace("SC ", ""))
 
     @reactive.Effect
     @reactive.event(input.remove_capa)
     def _remove_capa():
-        sc_id = input.sc_seleccionado().replace("SC ", "")
-        sc_id = int(sc_id)
-        current = sistemas.get().copy()
-        if current[sc_id]["capas_activas"] > 1:
-            nuevas_capas_activas = current[sc_id]["capas_activas"] - 1
-            current[sc_id]["capas_activas"] = nuevas_capas_activas
-            sistemas.set(current)    
+        sc_id = sc_actual()
+        capas_activas = sistemas[sc_id].get()["capas_activas"]
+        if capas_activas > 1:
+            actualizar_sistema(sc_id, capas_activas=capas_activas - 1)
+            ui.remove_accordion_panel(f"capas_accordion_{sc_id}", f"capa_{capas_activas}")
 
     @reactive.Effect
     @reactive.event(input.add_capa)
     def _add_capa():
-        sc_id = input.sc_seleccionado().replace("SC ", "")
-        sc_id = int(sc_id)
-        current = sistemas.get().copy()
+        sc_id = sc_actual()
+        sistema = sistemas[sc_id].get()
+        if sistema["capas_activas"] < MAX_CAPAS:
+            capa_id = sistema["capas_activas"] + 1
+            actualizar_sistema(sc_id, capas_activas=capa_id)
+            ui.insert_accordion_panel(f"capas_accordion_{sc_id}", capa_panel(sc_id, capa_id, sistema["capas"][capa_id]))
 
-        if current[sc_id]["capas_activas"] < MAX_CAPAS:
-            current[sc_id]["capas_activas"] += 1
-            sistemas.set(current)
-    
     # Convertir numeros a subindice
     def subIndex(cadena):
         SUB = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
@@ -333,32 +675,46 @@ def server(input, output, session):
     ********************************
     """
 
-    # ui del contenedor de sistemas constructivos
-    @output
-    @render.ui
-    def ui_sistemas():
-        num_sistemas = input.num_sc()
-        try:
-            selected = input.sc_seleccionado()
-        except:
-            selected = f"SC {num_sistemas}"
-            
-        return ui.navset_card_tab(
-            *sc_paneles(num_sistemas, sistemas.get()),
-            id = "sc_seleccionado",
-            selected=selected
-            )
-
     # ui de métricas
     @output
     @render.ui
     def ui_metricas():
-        if soluciones_dataframe.get().empty:
+        if resultado.get().empty:
             return "Aún no hay métricas...\nHaz una simulación para empezar"
         
         else:
-            return ui.output_data_frame("metricas_table")
+            return [ui.output_ui("aviso_metricas"), ui.output_data_frame("metricas_table")]
+
+    # Aviso mientras se muestran los resultados de la vista previa
+    def aviso_provisional():
+        if resultado.get().provisional:
+            return ui.div(
+                f"Vista previa (Nx = {NX_PREVIA}): valores provisionales, se reemplazan al terminar el cálculo.",
+                class_="alert alert-warning py-1 mb-2",
+            )
+        return None
+
+    @render.ui
+    def aviso_metricas():
+        return aviso_provisional()
+
+    @render.ui
+    def aviso_graficas():
+        return aviso_provisional()
     
+    # ui de la corrida de 12 meses
+    @output
+    @render.ui
+    def ui_anual():
+        if anual_mensual.get().empty:
+            return "Aún no hay resultados anuales...\nActiva \"Los 12 meses\" y presiona Calcular"
+
+        return [
+            ui.card(ui.card_header("Por mes"), output_widget("anual_plot")),
+            ui.card(ui.card_header("Resumen anual"), ui.output_data_frame("anual_resumen_table")),
+            ui.card(ui.card_header("Métricas mensuales"), ui.output_data_frame("anual_mensual_table")),
+        ]
+
     # ui para subir archivo
     @output
     @render.ui
@@ -373,27 +729,25 @@ def server(input, output, session):
         if dia_promedio_dataframe.get().empty:
             return "Aún no hay datos para mostrar..."
         else:
-            if soluciones_dataframe.get().empty:
+            if resultado.get().empty:
                 return [
-                    ui.output_data_frame("dia_df"),
+                    ui.output_data_frame("tabla_df"),
                     ui.download_button("down_dia", "Descargar datos", width="100%"),
                 ]
 
             else:
                 return [
-                    ui.output_data_frame("sol_df"),
+                    ui.output_data_frame("tabla_df"),
                     ui.download_button("down_res", "Descargar datos", width="100%"),
                 ]
             
     @output
     @render.ui
     def ui_graficas_eh():
-        # Use consistent widget outputs, let the functions decide what to render
-        aire = aire_simulacion.get()
-        plot_title = "Energía" if aire else "Temperatura"
-
+        # Sin dependencias reactivas: los widgets se crean una vez y se modifican en el lugar
         return [
-                ui.card(ui.card_header(plot_title), output_widget("main_plot")),
+                ui.output_ui("aviso_graficas"),
+                ui.card(ui.card_header(ui.output_text("titulo_main_plot", inline=True)), output_widget("main_plot")),
                 ui.card(ui.card_header("Irradiancia"), output_widget("irr_plot"))
             ]
 
@@ -404,172 +758,327 @@ def server(input, output, session):
     """
     
     @render.data_frame
+    @trazas.medir("render.metricas_table")
     def metricas_table():
-        current =  metricas.get().copy()
-        aire = aire_simulacion.get()
+        current = resultado.get().metricas
+        aire = resultado.get().aire
+        # Sin cálculo todavía (o tras cancelar el primero) no hay columnas que mostrar
+        if current.empty:
+            return None
         
         if aire==True:
-            display_metricas_df = current[["SC\n[material : m]" ,"a\n[-]", "Eenf\n[Wh/m²]", "Ecal\n[Wh/m²]", "Etotal\n[Wh/m²]"]]
+            display_metricas_df = current[["SC\n[material : m]" ,"a\n[-]", "Eenf\n[Wh/m²]", "Ecal\n[Wh/m²]", "Etotal\n[Wh/m²]", "Nx\n[-]", "t\n[s]"]]
                     
         else:
-            display_metricas_df = current[["SC\n[material : m]","a\n[-]","FD\n[-]","FDsa\n[-]","TR\n[HH:MM]","ET\n[Wh/m²]"]]
+            display_metricas_df = current[["SC\n[material : m]","a\n[-]","FD\n[-]","FDsa\n[-]","TR\n[HH:MM]","ET\n[Wh/m²]", "Ti máx\n[°C]", "Confort\n[h]", "GH sobre\n[°C·h]", "GH bajo\n[°C·h]", "Nx\n[-]", "t\n[s]"]]
             
         return render.DataTable(display_metricas_df, width="100%")
     
-    # DataGrid del día promedio
+    # Tablas de la corrida de 12 meses
     @render.data_frame
-    def dia_df():
-        datos = dia_promedio_dataframe.get().copy()
-        if not datos.empty:
-            show_datos = datos[['Tn', 'DeltaTn', 'Ta', 'Ig', 'Ib', 'Id']].round(2)
-            show_datos.insert(0, "Time", show_datos.index)
-            return render.DataGrid(
-                data=show_datos, width="100%", summary="Viendo filas {start} a {end} de {total}"
-            )
+    def anual_mensual_table():
+        mensual = anual_mensual.get()
+        if mensual.empty:
+            return None
+        columnas = ["Mes", "SC", "FD", "TR [h]"]
+        if con_aire(mensual):
+            columnas += ["Eenf [Wh/m²]", "Ecal [Wh/m²]", "Etotal [Wh/m²]"]
+        else:
+            columnas += ["ET [Wh/m²]"]
+        return render.DataGrid(mensual[columnas].round(3), width="100%")
 
-    # DataGrid de la Tsa y Ti
     @render.data_frame
-    def sol_df():
-        datos = soluciones_dataframe.get().copy()
-        if not datos.empty:
-            datos = datos.round(2)
-            datos.insert(0, "Time", datos.index)
+    def anual_resumen_table():
+        mensual = anual_mensual.get()
+        if mensual.empty:
+            return None
+        resumen = resumen_anual(mensual)
+        return render.DataTable(resumen.round(3), width="100%")
+
+    # Tabla de Resultados: la Tsa y Ti o, si aún no hay, el día promedio
+    @reactive.calc
+    def tabla_fuente():
+        actual = resultado.get()
+        if not actual.empty:
+            return actual, list(actual.tabla.columns)
+        return vistas_compartidas(dia_promedio_dataframe.get()), ['Tn', 'DeltaTn', 'Ta', 'Ig', 'Ib', 'Id']
+
+    # Columnas de orden y filtro según la tabla que se muestra
+    @reactive.effect
+    def opciones_tabla():
+        _, columnas = tabla_fuente()
+        with reactive.isolate():
+            orden, filtro = input.tabla_orden(), input.tabla_filtro()
+        ui.update_select(
+            "tabla_orden",
+            choices={"Time": "Hora", **{c: c for c in columnas}},
+            selected=orden if orden in columnas else "Time",
+        )
+        ui.update_select(
+            "tabla_filtro",
+            choices={"": "Sin filtro", **{c: c for c in columnas}},
+            selected=filtro if filtro in columnas else "",
+        )
+
+    # Cualquier cambio de datos, orden o filtro regresa a la primera página
+    @reactive.effect
+    @reactive.event(
+        tabla_fuente,
+        input.tabla_intervalo,
+        input.tabla_orden,
+        input.tabla_descendente,
+        input.tabla_filtro,
+        input.tabla_minimo,
+        input.tabla_maximo,
+        ignore_init=True,
+    )
+    def primera_pagina():
+        ui.update_numeric("tabla_pagina", value=1)
+
+    @reactive.calc
+    def tabla_pagina():
+        vistas, columnas = tabla_fuente()
+        if vistas.empty:
+            return None
+        # Mientras llegan las opciones nuevas, las columnas que ya no existen se ignoran
+        orden = input.tabla_orden() if input.tabla_orden() in columnas else "Time"
+        filtro = input.tabla_filtro() if input.tabla_filtro() in columnas else None
+        return pagina(
+            vistas.agregada(input.tabla_intervalo()),
+            columnas,
+            orden=orden,
+            descendente=input.tabla_descendente(),
+            filtro=filtro,
+            minimo=input.tabla_minimo(),
+            maximo=input.tabla_maximo(),
+            numero=input.tabla_pagina(),
+        )
+
+    # Sólo la página visible viaja al navegador
+    @render.data_frame
+    @trazas.medir("render.tabla_df")
+    def tabla_df():
+        actual = tabla_pagina()
+        if actual is not None:
+            datos, _, _ = actual
             return render.DataGrid(
-                data=datos, width="100%", summary="Viendo filas {start} a {end} de {total}"
+                data=datos, width="100%", summary=False
             )
         else:
             return None
 
+    @render.text
+    def tabla_resumen():
+        actual = tabla_pagina()
+        if actual is None:
+            return ""
+        datos, total, numero = actual
+        inicio = (numero - 1) * FILAS_PAGINA
+        return f"Filas {min(inicio + 1, total)} a {inicio + len(datos)} de {total}"
+
 
     """
     ================================
             Gráficas (Plotly)
     ================================
     """
+    # Pirámides de resoluciones de las series (memorizadas junto a los datos)
+    def piramide_dia():
+        return vistas_compartidas(dia_promedio_dataframe.get()).piramide(["Ta", "Ig", "Ib", "Id"])
+
+    def piramide_sol(actual):
+        return actual.piramide([c for c in actual.tabla.columns if c.startswith(("T", "I"))])
+
+    # Las gráficas son widgets persistentes de la sesión: se crean una vez y
+    # después sólo se modifican (trazas, franja de confort, visibilidad).
+    graficas = {"main_plot": GraficaSeries(), "irr_plot": GraficaSeries()}
+
+    def ver_Tsa(nombre):
+        return input.mostrar_Tsa() or not nombre.startswith("Tsa")
+
     # Main plot - handles both Energia (with AC) and Temperatura (without AC)
-    @render_widget
-    def main_plot():
-        # Get current state
-        current_aire = aire_simulacion.get()
-        sol_data = soluciones_dataframe.get()
+    def dibujar_main_plot():
+        grafica = graficas["main_plot"]
+        actual = resultado.get()
+        current_aire = actual.aire
+        sol_data = actual.tabla
         dia_data = dia_promedio_dataframe.get()
+        metricas_data = actual.metricas
+
+        if grafica.ya_dibujado(actual, dia_data):
+            return
 
         if current_aire:
             # Energia plot (Con AC)
-            display_data = metricas.get().copy()
-
             # Defensive check: only render if we have AC data
-            if display_data.empty:
-                return None
-
-            # Check that required columns exist
             required_cols = ["Eenf\n[Wh/m²]", "Ecal\n[Wh/m²]", "Etotal\n[Wh/m²]"]
-            if not all(col in display_data.columns for col in required_cols):
-                return None
-
-            display_data.insert(0, "Sistema", display_data.index + 1)
-            display_data.rename(inplace=True, columns={"Eenf\n[Wh/m²]" : "Eenf", "Ecal\n[Wh/m²]" : "Ecal", "Etotal\n[Wh/m²]" : "Etotal"})
-            display_data = display_data.melt(id_vars=["Sistema", "Etotal"], value_vars=["Eenf", "Ecal"], var_name="tipo", value_name="value")
-
-            solucion_plot = px.bar(display_data,
-                                x="Sistema",
-                                y="value",
-                                color="tipo",
-                                labels={"tipo" : "Energía", "value" : "Wh/m²"},
-                                barmode="stack",
-                                text_auto=True,
-                                hover_data={"Etotal"},
-                            )
-            return solucion_plot
+            if metricas_data.empty or not all(col in metricas_data.columns for col in required_cols):
+                grafica.limpiar()
+                return
+
+            grafica.barras(
+                x=list(range(1, len(metricas_data) + 1)),
+                columnas={
+                    "Eenf": metricas_data["Eenf\n[Wh/m²]"].to_numpy(),
+                    "Ecal": metricas_data["Ecal\n[Wh/m²]"].to_numpy(),
+                },
+                etiqueta_x="Sistema",
+                etiqueta_y="Wh/m²",
+                leyenda="Energía",
+                hover={"Etotal": metricas_data["Etotal\n[Wh/m²]"].to_numpy()},
+            )
+            return
 
+        # Temperatura plot (Sin AC)
+        if dia_data.empty:
+            grafica.limpiar()
+            return
+
+        if sol_data.empty:
+            # Gráfica de día promedio (por segundo, reducida según el zoom)
+            display_data = dia_data
+            grafica.series(piramide_dia(), ["Ta"], "°C", "Temperatura")
         else:
-            # Temperatura plot (Sin AC)
-            if dia_data.empty:
-                return None
-
-            if sol_data.empty:
-                # Gráfica de día promedio
-                display_data = dia_data.copy()[::60]  # Cada segundo
-
-                solucion_plot = px.scatter(
-                    data_frame=display_data,
-                    x=display_data.index,
-                    y=["Ta"],
-                    labels={"index": "Hora", "value": "°C", "variable": "Temperatura"},
-                )
-            else:
-                display_data = sol_data.copy()
-                columnas = []
-                for i in display_data.columns[1:]:
-                    if i.startswith("T") and i != "Tn":
-                        columnas.append(i)
-
-                # Limpieza de Tsa
-                if not input.mostrar_Tsa():
-                    for i in columnas:
-                        if i.startswith("Tsa"):
-                            columnas.remove(i)
-
-                solucion_plot = px.scatter(
-                    data_frame=display_data,
-                    x=display_data.index,
-                    y=columnas,
-                    labels={"index": "Hora", "value": "Temperatura [°C]", "variable": "Temperatura"},
-                )
+            display_data = sol_data
+            # Tsa siempre va en la figura; el switch sólo cambia su visibilidad
+            columnas = [c for c in sol_data.columns[1:] if c.startswith("T") and c != "Tn"]
+            with reactive.isolate():
+                grafica.series(piramide_sol(actual), columnas, "Temperatura [°C]", "Temperatura", visible=ver_Tsa)
+
+        # Franja horizontal
+        grafica.franja(
+            y0=display_data["Tn"].mean() - display_data["DeltaTn"].mean(),
+            y1=display_data["Tn"].mean() + display_data["DeltaTn"].mean(),
+        )
 
-            # Franja horizontal
-            solucion_plot.add_hrect(
-                y0=display_data["Tn"].mean() - display_data["DeltaTn"].mean(),
-                y1=display_data["Tn"].mean() + display_data["DeltaTn"].mean(),
-                fillcolor="lime",
-                opacity=0.3,
-                line_width=0,
-            )
-            return solucion_plot
+    # Irradiancia
+    def dibujar_irr_plot():
+        grafica = graficas["irr_plot"]
+        actual = resultado.get()
+        sol_data = actual.tabla
+        dia_data = dia_promedio_dataframe.get()
 
-    # Keep old function names for backwards compatibility but point to main_plot
-    @render_widget
-    def energia_plot():
-        return main_plot()
+        if grafica.ya_dibujado(actual, dia_data):
+            return
+
+        if dia_data.empty:
+            grafica.limpiar()
+        elif sol_data.empty:
+            # Gráfica solo con día promedio
+            grafica.series(piramide_dia(), ["Ig", "Ib", "Id"], "Irradiancia [W/m²]", "Irradiancia")
+        else:
+            columnas = [c for c in sol_data.columns[1:] if c.startswith("I")]
+            grafica.series(piramide_sol(actual), columnas, "W/m²", "Irradiancia")
 
     @render_widget
-    def temperatura_plot():
-        return main_plot()
+    def main_plot():
+        with reactive.isolate():
+            dibujar_main_plot()
+        return graficas["main_plot"].fig
 
-    # Irradiancia
     @render_widget
     def irr_plot():
-        sol_data = soluciones_dataframe.get()
-        dia_data = dia_promedio_dataframe.get()
+        with reactive.isolate():
+            dibujar_irr_plot()
+        return graficas["irr_plot"].fig
 
-        if dia_data.empty:
+    @reactive.effect
+    def actualizar_main_plot():
+        dibujar_main_plot()
+
+    @reactive.effect
+    def actualizar_irr_plot():
+        dibujar_irr_plot()
+
+    @reactive.effect
+    @reactive.event(input.mostrar_Tsa)
+    def mostrar_Tsa_main_plot():
+        graficas["main_plot"].mostrar(ver_Tsa)
+
+    @render.text
+    def titulo_main_plot():
+        return "Energía" if resultado.get().aire else "Temperatura"
+
+    # Energía total (con AC) o FD (sin AC) de cada mes y sistema
+    @render_widget
+    @trazas.medir("render.anual_plot")
+    def anual_plot():
+        import plotly.express as px
+
+        mensual = anual_mensual.get()
+        if mensual.empty:
             return None
 
-        if sol_data.empty:
-            # Gráfica solo con día promedio
-            display_data = dia_data.copy()[::60]  # Cada segundo
-            solucion_plot = px.scatter(
-                data_frame=display_data,
-                x=display_data.index,
-                y=["Ig", "Ib", "Id"],
-                labels={"index": "Hora", "value": "Irradiancia [W/m²]", "variable": "Irradiancia"},
+        if con_aire(mensual):
+            anual_plot = px.bar(
+                mensual,
+                x="Mes",
+                y="Etotal [Wh/m²]",
+                color="SC",
+                barmode="group",
+                hover_data=["Eenf [Wh/m²]", "Ecal [Wh/m²]"],
             )
-
         else:
-            display_data = sol_data.copy()
-
-            columnas = []
-            for i in display_data.columns[1:]:
-                if i.startswith("I"):
-                    columnas.append(i)
-            solucion_plot = px.scatter(
-                data_frame=display_data,
-                x=display_data.index,
-                y=columnas,
-                labels={"index": "Hora", "value": "W/m²", "variable": "Irradiancia"},
+            anual_plot = px.line(
+                mensual,
+                x="Mes",
+                y="FD",
+                color="SC",
+                markers=True,
+                hover_data=["TR [h]"],
             )
+        return anual_plot
 
-        return solucion_plot
+    # Mapa de calor del barrido paramétrico
+    @render_widget
+    @trazas.medir("render.barrido_plot")
+    def barrido_plot():
+        import plotly.express as px
+
+        tabla = tarea_barrido.result()
+        metrica = input.barrido_metrica()
+
+        if tabla[metrica].isna().all():
+            ui.notification_show(f"{metrica} no está disponible en este modo de AC", type="warning")
+            return None
+
+        matriz = matriz_barrido(tabla, metrica).astype(float)
+        ejes = [c for c in tabla.columns if c in EJES]
+        etiquetas = {"color": METRICAS[metrica], "x": EJES[ejes[0]]}
+        if len(ejes) == 2:
+            etiquetas.update(x=EJES[ejes[0]], y=EJES[ejes[1]])
+
+        barrido_plot = px.imshow(
+            matriz,
+            labels=etiquetas,
+            aspect="auto",
+            text_auto=".2f",
+            color_continuous_scale="RdYlBu_r",
+        )
+        return barrido_plot
+
+
+    """
+    ================================
+              Diagnóstico
+    ================================
+    """
+    if DEBUG:
+        @render.data_frame
+        def diagnostico_etapas():
+            reactive.invalidate_later(5)
+            return render.DataGrid(trazas.resumen().round(2), width="100%")
+
+        @render.data_frame
+        def diagnostico_caches():
+            reactive.invalidate_later(5)
+            stats = pd.DataFrame(estadisticas()).T
+            return render.DataGrid(stats.rename_axis("Caché").reset_index().round(3), width="100%")
+
+        @render.data_frame
+        def diagnostico_memoria():
+            reactive.invalidate_later(5)
+            return render.DataGrid(presupuesto.uso().round(2), width="100%")
 
 
     """
@@ -577,26 +1086,54 @@ def server(input, output, session):
                 Descargas          
     ================================
     """
+    # Se generan por bloques en un hilo: la descarga empieza de inmediato y
+    # el servidor no arma el archivo completo en memoria.
     @render.download(
-        filename=lambda: f"enerhabitat-meanday-{date.today().isoformat()}.csv"
+        filename=lambda: f"enerhabitat-meanday-{date.today().isoformat()}.{input.formato_descarga()}",
+        media_type=lambda: exportar.MEDIA[input.formato_descarga()],
     )
-    def down_dia():
-        down_data = dia_promedio_dataframe.get().copy()
-        if down_data is None or down_data.empty:
+    async def down_dia():
+        down_data = dia_promedio_dataframe.get()
+        if down_data.empty:
             return
-        down_data = down_data.round(1)
-        down_data.insert(0, "Time", down_data.index)
-        csv_bytes = down_data.to_csv(index=False).encode("utf-8-sig")
-        yield csv_bytes
-
-    @render.download(filename=lambda: f"enerhabitat-{date.today().isoformat()}.csv")
-    def down_res():
-        down_data = soluciones_dataframe.get().copy()
-        if down_data is None or down_data.empty:
+        meta = {"epw": os.path.basename(str(current_file.get())), "mes": input.mes()}
+        async for bloque in exportar.en_hilo(exportar.descargar(down_data, input.formato_descarga(), meta)):
+            yield bloque
+
+    @render.download(
+        filename=lambda: f"enerhabitat-{date.today().isoformat()}.{input.formato_descarga()}",
+        media_type=lambda: exportar.MEDIA[input.formato_descarga()],
+    )
+    async def down_res():
+        actual = resultado.get()
+        if actual.empty:
             return
-        down_data = down_data.round(1)
-        down_data.insert(0, "Time", down_data.index)
-        csv_bytes = down_data.to_csv(index=False).encode("utf-8-sig")
-        yield csv_bytes
+        async for bloque in exportar.en_hilo(exportar.descargar(actual.tabla, input.formato_descarga(), actual.metadatos)):
+            yield bloque
+
+app_shiny = App(app_ui, server, static_assets={"/img": Path(IMG_DIR).resolve()})
+
+
+@trazas.medir("arranque.precalentar")
+def precalentar():
+    """Importa enerhabitat (pvlib, scipy), shinywidgets y plotly.express."""
+    import enerhabitat  # noqa: F401
+    import plotly.express  # noqa: F401
+    import shinywidgets  # noqa: F401
+
+
+@contextlib.asynccontextmanager
+async def arranque(app):
+    # El servidor ya acepta conexiones mientras esto corre
+    if PRECALENTAR:
+        threading.Thread(target=precalentar, name="precalentar", daemon=True).start()
+    # Un solo barrido de memoria para todas las sesiones del proceso
+    barrido = asyncio.create_task(barrer_periodicamente())
+    try:
+        yield
+    finally:
+        barrido.cancel()
+
 
-app = App(app_ui, server)
+# La API de lotes comparte proceso, pool y cachés con la app de Shiny
+app = Starlette(routes=[*api_rutas, Mount("/", app=app_shiny)], lifespan=arranque)
@@ -0,0 +1,14 @@
+# benchmarks/__init__.py
+# -*- coding: utf-8 -*-
+"""
+Benchmarks del pipeline de simulación (el mismo camino que calculate_solucion):
+carga del EPW y meanDay, Tsa, solver con y sin AC, métricas, y construcción
+de gráficas, DataGrid y descargas. Usan el EPW de Cuernavaca incluido.
+Cada corrida se guarda en benchmarks/resultados/<commit>.json para comparar
+entre commits.
+Uso:
+    python -m benchmarks                    # suite completa
+    python -m benchmarks --rapido           # subconjunto de parámetros
+    python -m benchmarks -k solver          # sólo casos cuyo nombre contiene "solver"
+    python -m benchmarks --comparar abc1234 # compara contra otra corrida guardada
+"""
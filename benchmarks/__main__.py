@@ -0,0 +1,151 @@
+# benchmarks/__main__.py
+# -*- coding: utf-8 -*-
+"""
+Corre las comprobaciones de benchmarks.verificar y, si pasan, los casos de
+benchmarks.casos; guarda los tiempos por commit y los compara con otra corrida. El almacén y la caché de resultados se redirigen a
+un directorio temporal para no tocar data/ ni medir aciertos de caché viejos.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from importlib.metadata import version
+from pathlib import Path
+
+RESULTADOS_DIR = Path(__file__).parent / "resultados"
+UMBRAL_REGRESION = 1.2  # Razón de tiempos mínimos a partir de la cual se marca una regresión
+
+
+def _clave(resultado: dict) -> str:
+    return f"{resultado['caso']} {json.dumps(resultado['parametros'], sort_keys=True)}"
+
+
+def medir(rapido: bool = False, filtro: str | None = None) -> list[dict]:
+    from benchmarks.casos import CASOS, combinaciones
+
+    resultados = []
+    for definicion in CASOS:
+        if filtro and filtro not in definicion["nombre"]:
+            continue
+        rejilla = definicion["rapido"] if rapido else definicion["parametros"]
+        for parametros in combinaciones(rejilla):
+            correr = definicion["funcion"](**parametros)
+            correr()  # Calentamiento: importaciones, JIT de numba, pool de procesos
+            tiempos = []
+            for _ in range(definicion["repeticiones"]):
+                inicio = time.perf_counter()
+                correr()
+                tiempos.append(time.perf_counter() - inicio)
+            resultado = {
+                "caso": definicion["nombre"],
+                "parametros": parametros,
+                "min": min(tiempos),
+                "mediana": statistics.median(tiempos),
+                "repeticiones": len(tiempos),
+            }
+            resultados.append(resultado)
+            print(f"{_clave(resultado):<60} min {resultado['min'] * 1e3:10.2f} ms   mediana {resultado['mediana'] * 1e3:10.2f} ms", flush=True)
+    return resultados
+
+
+def guardar(resultados: list[dict], rapido: bool) -> Path:
+    from utils.extraer import get_git_info
+    from utils.motor import MAX_PROCESOS
+
+    commit, rama = get_git_info(short=True)
+    ruta = RESULTADOS_DIR / f"{commit}.json"
+    # Corridas parciales (-k) del mismo commit se suman a las anteriores
+    if ruta.is_file():
+        nuevas = {_clave(r) for r in resultados}
+        previas = json.loads(ruta.read_text(encoding="utf-8"))["resultados"]
+        resultados = [r for r in previas if _clave(r) not in nuevas] + resultados
+    corrida = {
+        "commit": commit,
+        "rama": rama,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "rapido": rapido,
+        "python": platform.python_version(),
+        "enerhabitat": version("enerhabitat"),
+        "procesos": MAX_PROCESOS,
+        "maquina": platform.node(),
+        "resultados": resultados,
+    }
+    RESULTADOS_DIR.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(json.dumps(corrida, indent=1, ensure_ascii=False), encoding="utf-8")
+    return ruta
+
+
+def _anterior(actual: Path, referencia: str | None) -> Path | None:
+    if referencia:
+        candidatos = sorted(RESULTADOS_DIR.glob(f"{referencia}*.json"))
+        return candidatos[0] if candidatos else None
+    otros = [p for p in RESULTADOS_DIR.glob("*.json") if p != actual]
+    return max(otros, key=lambda p: p.stat().st_mtime) if otros else None
+
+
+def comparar(actual: Path, referencia: Path) -> int:
+    """Imprime la razón de tiempos mínimos por caso. Regresa el número de regresiones."""
+    nueva = json.loads(actual.read_text(encoding="utf-8"))
+    vieja = json.loads(referencia.read_text(encoding="utf-8"))
+    anteriores = {_clave(r): r for r in vieja["resultados"]}
+    print(f"\nComparación {vieja['commit']} -> {nueva['commit']}")
+    regresiones = 0
+    for resultado in nueva["resultados"]:
+        previo = anteriores.get(_clave(resultado))
+        if previo is None:
+            continue
+        razon = resultado["min"] / previo["min"]
+        marca = ""
+        if razon > UMBRAL_REGRESION:
+            marca = "  <- más lento"
+            regresiones += 1
+        elif razon < 1 / UMBRAL_REGRESION:
+            marca = "  <- más rápido"
+        print(f"{_clave(resultado):<60} {razon:6.2f}x{marca}")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks de EnerHabitat")
+    parser.add_argument("--rapido", action="store_true", help="subconjunto de parámetros")
+    parser.add_argument("-k", dest="filtro", help="sólo casos cuyo nombre contiene este texto")
+    parser.add_argument("--sin-verificar", action="store_true", help="no correr las comprobaciones de resultados")
+    parser.add_argument("--comparar", nargs="?", const="", metavar="COMMIT",
+                        help="comparar con la corrida de COMMIT (por defecto la más reciente)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temporal:
+        from utils import almacen, cache
+
+        almacen.ALMACEN_DIR = os.path.join(temporal, "almacen")
+        cache.resultados.ruta = os.path.join(temporal, "resultados.sqlite")
+        if not args.sin_verificar:
+            from benchmarks.verificar import verificar
+
+            if verificar():
+                print("\nHay comprobaciones que fallan; no se miden tiempos.")
+                sys.exit(1)
+            print()
+        resultados = medir(args.rapido, args.filtro)
+
+    ruta = guardar(resultados, args.rapido)
+    print(f"\nResultados en {ruta}")
+
+    if args.comparar is not None:
+        referencia = _anterior(ruta, args.comparar or None)
+        if referencia is None:
+            print("No hay otra corrida con la cual comparar.")
+            return
+        if comparar(ruta, referencia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
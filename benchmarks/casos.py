@@ -0,0 +1,229 @@
+# benchmarks/casos.py
+# -*- coding: utf-8 -*-
+"""
+Casos de benchmark. Cada caso es una función que recibe sus parámetros,
+hace la preparación que no se mide y regresa una función sin argumentos,
+que es lo que se cronometra:
+
+    @caso("solver", {"capas": [1, 2]}, rapido={"capas": [1]})
+    def solver(capas):
+        ...preparación...
+        return lambda: resolver_temperatura(...)
+"""
+
+from __future__ import annotations
+import os
+import subprocess
+import sys
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import enerhabitat as eh
+from shiny import render
+
+from utils import cache, exportar, metricas
+from utils.card import MAX_CAPAS, MAX_SC
+from utils.graficas import GraficaSeries, Piramide
+from utils.motor import resolver_sistemas, resolver_temperatura
+from utils.resultado import Resultado, pagina
+from utils.tsa import CapaTsa
+
+RAIZ = Path(__file__).resolve().parent.parent
+EPW = "./data/epw/MEX_MOR_Cuernavaca-Matamoros.Intl.AP.767260_TMYx.2004-2018.epw"
+MES = "05"
+NX_BENCH = (25, 50, 200)
+
+CASOS = []
+
+
+def caso(nombre: str, parametros: dict | None = None, rapido: dict | None = None, repeticiones: int = 5):
+    """Registra un caso con la rejilla completa de parámetros y la del modo rápido."""
+    def registrar(funcion):
+        CASOS.append({
+            "nombre": nombre,
+            "funcion": funcion,
+            "parametros": parametros or {},
+            "rapido": rapido if rapido is not None else (parametros or {}),
+            "repeticiones": repeticiones,
+        })
+        return funcion
+    return registrar
+
+
+def combinaciones(rejilla: dict) -> list[dict]:
+    nombres = list(rejilla)
+    return [dict(zip(nombres, valores)) for valores in product(*rejilla.values())]
+
+
+def _capas(n: int) -> list[tuple[str, float]]:
+    """n capas de 5 cm con materiales distintos."""
+    materiales = eh.config.materials_list()
+    return [(materiales[i % len(materiales)], 0.05) for i in range(n)]
+
+
+def _trabajos(num_sc: int, aire: bool, Nx: int) -> list[dict]:
+    return [
+        {
+            "sc_id": sc_id,
+            "epw": EPW,
+            "mes": MES,
+            "tilt": 90.0,
+            "azimuth": 180.0,
+            "absortancia": round(0.9 - 0.1 * sc_id, 2),
+            "capas": _capas(sc_id),
+            "aire": aire,
+            "Nx": Nx,
+        }
+        for sc_id in range(1, num_sc + 1)
+    ]
+
+
+def _sin_cache_resultados():
+    """Vacía la caché de resultados para que cada repetición resuelva de verdad."""
+    cache.resultados.clear()
+
+
+def _tabla_resultados(num_sc: int) -> pd.DataFrame:
+    """DataFrame de resultados como el de la app (clima + Tsa_i y Ti_i) para num_sc sistemas."""
+    [resultado] = resolver_sistemas(_trabajos(1, False, 25))
+    tabla = resultado["clima"]
+    for sc_id in range(1, num_sc + 1):
+        tabla = tabla.join(resultado["solucion"].add_suffix(f"_{sc_id}"), how="right")
+    return tabla
+
+
+# --- Datos climáticos ---------------------------------------------------------
+
+@caso("epw_meanday", repeticiones=3)
+def epw_meanday():
+    """EPW sin cachés: lectura del archivo y meanDay del mes."""
+    return lambda: eh.Location(epw_file=EPW).meanDay(month=MES)
+
+
+@caso("dia_promedio_almacen")
+def dia_promedio_almacen():
+    """meanDay desde el almacén (memoria mapeada) tras vaciar la LRU."""
+    cache.dia_promedio(EPW, MES)
+
+    def correr():
+        cache._dias_promedio.clear()
+        cache.dia_promedio(EPW, MES)
+    return correr
+
+
+@caso("tsa", {"tilt": [90, 0]})
+def tsa(tilt):
+    _, dia = cache.dia_promedio(EPW, MES)
+
+    def correr():
+        CapaTsa(dia, float(tilt), 180.0, eh.config.dt).calcular([0.8])
+    return correr
+
+
+# --- Solver ---------------------------------------------------------------------
+
+@caso(
+    "solver",
+    {"capas": list(range(1, MAX_CAPAS + 1)), "Nx": list(NX_BENCH), "aire": [False, True]},
+    rapido={"capas": [1, MAX_CAPAS], "Nx": [50], "aire": [False, True]},
+    repeticiones=3,
+)
+def solver(capas, Nx, aire):
+    _, dia = cache.dia_promedio(EPW, MES)
+    capa = CapaTsa(dia, 90.0, 180.0, eh.config.dt)
+    capa.calcular([0.8])
+    Tsa = capa.muestreo(0.8)
+    sistema = _capas(capas)
+    return lambda: resolver_temperatura(Tsa, capa.Tn, sistema, aire, Nx, capa.dt)
+
+
+# --- Pipeline completo (calculate_solucion) -----------------------------------
+
+@caso(
+    "pipeline",
+    {"num_sc": list(range(1, MAX_SC + 1)), "Nx": [50, 200], "aire": [False, True]},
+    rapido={"num_sc": [1, MAX_SC], "Nx": [50], "aire": [False]},
+    repeticiones=3,
+)
+def pipeline(num_sc, Nx, aire):
+    """Trabajos -> Tsa -> solver -> métricas, sin caché de resultados."""
+    trabajos = _trabajos(num_sc, aire, Nx)
+    cache.dia_promedio(EPW, MES)
+
+    def correr():
+        _sin_cache_resultados()
+        resolver_sistemas(trabajos)
+    return correr
+
+
+@caso("metricas", {"sistemas": [1, 5, 100, 400]}, rapido={"sistemas": [5, 400]})
+def metricas_vectorizadas(sistemas):
+    _, dia = cache.dia_promedio(EPW, MES)
+    capa = CapaTsa(dia, 90.0, 180.0, eh.config.dt)
+    capa.calcular([0.8])
+    Tsa_max, Tsa_min = capa.extremos(0.8)
+    rng = np.random.default_rng(0)
+    Ti = capa.Tn + rng.normal(0, 3, (sistemas, len(capa.indice)))
+    return lambda: metricas.calcular(
+        Ti, np.full(sistemas, Tsa_max), np.full(sistemas, Tsa_min), capa.Ta_max, capa.Ta_min,
+        capa.indice, capa.Ta_idxmax, capa.Tn, capa.DeltaTn, capa.dt,
+    )
+
+
+# --- Interfaz: gráficas, DataGrid y descargas ---------------------------------
+
+@caso("grafica", {"num_sc": [0, 1, MAX_SC]}, repeticiones=3)
+def grafica(num_sc):
+    """Pirámide de resoluciones y FigureWidget con las trazas reducidas (0 = día promedio)."""
+    if num_sc == 0:
+        _, tabla = cache.dia_promedio(EPW, MES)
+        columnas = ["Ta", "Ig", "Ib", "Id"]
+    else:
+        tabla = _tabla_resultados(num_sc)
+        columnas = [c for c in tabla.columns if c.startswith(("T", "I"))]
+
+    def correr():
+        GraficaSeries().series(Piramide(tabla, columnas), columnas, "°C", "Temperatura")
+    return correr
+
+
+@caso("datagrid", {"num_sc": [1, MAX_SC], "intervalo": ["1s", "1min", "1h"]}, rapido={"num_sc": [MAX_SC], "intervalo": ["1s"]})
+def datagrid(num_sc, intervalo):
+    """Resultado nuevo, agregación, una página ordenada y el DataGrid."""
+    tabla = _tabla_resultados(num_sc)
+
+    def correr():
+        resultado = Resultado(tabla)
+        datos, _, _ = pagina(resultado.agregada(intervalo), orden="Ti_1", descendente=True)
+        render.DataGrid(datos, width="100%")
+    return correr
+
+
+@caso("descarga", {"formato": ["csv", "csv.gz"]}, repeticiones=3)
+def descarga(formato):
+    """Descarga completa del día promedio (86,400 filas)."""
+    _, tabla = cache.dia_promedio(EPW, MES)
+    return lambda: sum(len(bloque) for bloque in exportar.descargar(tabla, formato))
+
+
+# --- Arranque en frío ---------------------------------------------------------
+
+# Código que corre un intérprete nuevo por etapa; se mide de principio a fin
+ARRANQUE = {
+    # Piso: shiny y pandas, que la app no puede diferir
+    "piso": "import shiny, pandas",
+    # Lo que tarda el servidor en poder aceptar conexiones
+    "import": "import app",
+    # Además: la primera página y lo que precalentar importa en segundo plano
+    "primera_pagina": "import app; app.app_ui(None); app.precalentar()",
+}
+
+
+@caso("arranque", {"etapa": list(ARRANQUE)}, repeticiones=5)
+def arranque(etapa):
+    """Intérprete nuevo que importa la app (sin precalentar al arrancar)."""
+    entorno = {**os.environ, "EH_PRECALENTAR": "0"}
+    comando = [sys.executable, "-c", ARRANQUE[etapa]]
+    return lambda: subprocess.run(comando, cwd=RAIZ, env=entorno, check=True)
@@ -0,0 +1,218 @@
+# benchmarks/verificar.py
+# -*- coding: utf-8 -*-
+"""
+Comprobaciones de resultados que corren antes de los benchmarks: un tiempo
+mejor no sirve si cambió lo que se calcula. Cada comprobación es una función
+sin argumentos que lanza AssertionError si algo no coincide:
+
+    @comprobacion("solver_paridad")
+    def solver_paridad():
+        assert ...
+
+Uso:
+    python -m benchmarks.verificar        # sólo las comprobaciones
+    python -m benchmarks                  # las comprobaciones y luego los tiempos
+"""
+
+from __future__ import annotations
+import os
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+EPW = "./data/epw/MEX_MOR_Cuernavaca-Matamoros.Intl.AP.767260_TMYx.2004-2018.epw"
+MES = "05"
+NX_PARIDAD = 25  # Basta para comparar el método; no se mide precisión física
+
+COMPROBACIONES = []
+
+
+def comprobacion(nombre: str):
+    """Registra una comprobación."""
+    def registrar(funcion):
+        COMPROBACIONES.append({"nombre": nombre, "funcion": funcion})
+        return funcion
+    return registrar
+
+
+# --- Solver -------------------------------------------------------------------
+
+@comprobacion("solver_paridad")
+def solver_paridad():
+    """
+    resolver_temperatura copia el ciclo de System.__calc_solve de enerhabitat;
+    debe dar lo mismo que System.solve() y System.solveAC() con la misma Tsa.
+    Si falla tras actualizar enerhabitat, el motor quedó desfasado de la biblioteca.
+    """
+    import enerhabitat as eh
+    from utils.motor import resolver_temperatura
+
+    capas = [("Adobe", 0.2), ("Ladrillo", 0.1)]
+    nx_original = eh.config.Nx
+    eh.config.Nx = NX_PARIDAD
+    try:
+        location = eh.Location(epw_file=EPW)
+        location.meanDay(month=MES)
+        for tilt in (0, 90):
+            sistema = eh.System(location, tilt=tilt, azimuth=180, absortance=0.7, layers=capas)
+            tsa = sistema.Tsa()
+            Tsa = tsa["Tsa"].iloc[::eh.config.dt].to_numpy()
+            Tn = tsa["Tn"].mean()
+
+            Ti = sistema.solve().to_numpy()
+            propio = resolver_temperatura(Tsa, Tn, capas, False, NX_PARIDAD, eh.config.dt)
+            np.testing.assert_allclose(propio["Ti"], Ti, rtol=0, atol=1e-9, err_msg=f"Ti sin AC, tilt {tilt}")
+            np.testing.assert_allclose(propio["ET"], sistema.energy_transfer, rtol=1e-12, err_msg=f"ET, tilt {tilt}")
+
+            Ti = sistema.solveAC().to_numpy()
+            propio = resolver_temperatura(Tsa, Tn, capas, True, NX_PARIDAD, eh.config.dt)
+            np.testing.assert_allclose(propio["Ti"], Ti, rtol=0, atol=1e-9, err_msg=f"Ti con AC, tilt {tilt}")
+            np.testing.assert_allclose(propio["Qcool"], sistema.cooling_energy, rtol=1e-12, err_msg=f"Qcool, tilt {tilt}")
+            np.testing.assert_allclose(propio["Qheat"], sistema.heating_energy, rtol=1e-12, err_msg=f"Qheat, tilt {tilt}")
+    finally:
+        eh.config.Nx = nx_original
+
+
+# --- Métricas, corrida anual, barridos y lotes ----------------------------------
+
+@comprobacion("tr_formato")
+def tr_formato():
+    """formato_tr da la vuelta al día y horas_tr es su inverso."""
+    from utils.metricas import SEGUNDOS_DIA, formato_tr, horas_tr
+
+    assert formato_tr(np.array([0, 59, 23 * 3600 + 1800, -1800])) == ["00:00", "00:00", "23:30", "23:30"]
+    minutos = np.arange(0, SEGUNDOS_DIA, 60)
+    assert [round(horas_tr(tr) * 3600) for tr in formato_tr(minutos)] == minutos.tolist()
+
+
+@comprobacion("anual_media_circular")
+def anual_media_circular():
+    """TR es un retraso módulo 24 h: 23:30 y 00:30 promedian 00:00, no 12:00."""
+    from utils.anual import media_circular
+
+    casos = {(23.5, 0.5): 0.0, (22.0, 2.0): 0.0, (1.0, 2.0, 3.0): 2.0, (23.0, 23.0): 23.0, (11.0, 13.0): 12.0}
+    for horas, esperado in casos.items():
+        media = media_circular(pd.Series(horas))
+        assert 0 <= media < 24, (horas, media)
+        assert abs(media - esperado) < 1e-9, (horas, media, esperado)
+
+
+@comprobacion("anual_tabla_mensual")
+def anual_tabla_mensual():
+    """Energías escaladas por los días del mes, TR en horas y TR estacional circular."""
+    from utils.anual import dias_mes, resumen_anual, tabla_mensual
+
+    def metricas(TR, ET):
+        return {"FD": 0.5, "TR": TR, "Eenf": None, "Ecal": None, "Etotal": None, "ET": ET}
+
+    indice = {1: ("01", 1), 2: ("12", 1), 3: ("01", 2), 4: ("12", 2)}
+    resultados = [
+        {"sc_id": 4, "metricas": metricas("02:00", 4.0)},
+        {"sc_id": 1, "metricas": metricas("23:30", 1.0)},
+        {"sc_id": 3, "metricas": metricas("04:00", 3.0)},
+        {"sc_id": 2, "metricas": metricas("00:30", 2.0)},
+    ]
+    mensual = tabla_mensual(indice, resultados, ["Adobe", "Ladrillo"])
+    assert mensual[["mes", "SC"]].values.tolist() == [["01", "SC 1"], ["01", "SC 2"], ["12", "SC 1"], ["12", "SC 2"]]
+    assert mensual["Sistema"].tolist() == ["Adobe", "Ladrillo", "Adobe", "Ladrillo"]
+    assert mensual["TR [h]"].tolist() == [23.5, 4.0, 0.5, 2.0]
+    assert mensual["ET [Wh/m²]"].tolist() == [1.0 * dias_mes("01"), 3.0 * dias_mes("01"), 2.0 * dias_mes("12"), 4.0 * dias_mes("12")]
+    assert mensual["Etotal [Wh/m²]"].isna().all()
+
+    resumen = resumen_anual(mensual).set_index("SC")
+    assert abs(resumen.loc["SC 1", "TR [h] Invierno"]) < 1e-9, resumen.loc["SC 1", "TR [h] Invierno"]
+    assert abs(resumen.loc["SC 2", "TR [h] Invierno"] - 3.0) < 1e-9
+    assert resumen.loc["SC 1", "ET anual [Wh/m²]"] == 1.0 * dias_mes("01") + 2.0 * dias_mes("12")
+
+
+@comprobacion("barrido_limites")
+def barrido_limites():
+    """generar_trabajos admite hasta MAX_CELDAS combinaciones y sólo cambia la capa indicada."""
+    from utils.barrido import MAX_CELDAS, generar_trabajos, rango
+
+    base = {"epw": EPW, "mes": MES, "tilt": 90.0, "azimuth": 180.0, "absortancia": 0.8,
+            "capas": [("Adobe", 0.2), ("Ladrillo", 0.1)], "aire": False, "Nx": 25}
+    lado = int(MAX_CELDAS ** 0.5)
+    ejes = {"ancho": rango(0.05, 0.3, lado), "absortancia": rango(0.2, 0.9, MAX_CELDAS // lado)}
+    celdas, trabajos = generar_trabajos(base, 2, ejes)
+    assert len(trabajos) == MAX_CELDAS
+    assert [t["sc_id"] for t in trabajos] == list(range(1, MAX_CELDAS + 1))
+    assert all(t["capas"][0] == ("Adobe", 0.2) and t["capas"][1] == ("Ladrillo", c["ancho"]) for c, t in zip(celdas, trabajos))
+    assert all(t["absortancia"] == c["absortancia"] for c, t in zip(celdas, trabajos))
+    assert base["capas"] == [("Adobe", 0.2), ("Ladrillo", 0.1)] and "sc_id" not in base
+
+    # Los repetidos no cuentan como combinaciones
+    celdas, _ = generar_trabajos(base, 1, {"material": ["Adobe", "Adobe", "Ladrillo"]})
+    assert celdas == [{"material": "Adobe"}, {"material": "Ladrillo"}]
+
+    invalidos = [
+        (1, {"ancho": rango(0.05, 0.3, lado + 1), "absortancia": rango(0.2, 0.9, MAX_CELDAS // lado)}),
+        (1, {"ancho": [0.1], "absortancia": [0.5], "material": ["Adobe"]}),
+        (3, {"ancho": [0.1]}),
+        (0, {"ancho": [0.1]}),
+    ]
+    for capa, ejes in invalidos:
+        try:
+            generar_trabajos(base, capa, ejes)
+        except ValueError:
+            continue
+        raise AssertionError(f"generar_trabajos aceptó capa={capa}, ejes={list(ejes)}")
+
+
+@comprobacion("lote_expansion")
+def lote_expansion():
+    """normalizar combina las listas, numera los trabajos y corta en el máximo sin armar el producto."""
+    from utils.lote import leer_entradas, normalizar
+
+    epw = os.path.basename(EPW)
+    trabajos = normalizar([{"epw": epw, "capas": [["Adobe", 0.2]], "mes": "todos", "tilt": [0, 90]}])
+    assert len(trabajos) == 24
+    assert [t["sc_id"] for t in trabajos] == list(range(1, 25))
+    assert sorted({(t["mes"], t["tilt"]) for t in trabajos}) == sorted((f"{m:02}", float(t)) for m in range(1, 13) for t in (0, 90))
+    assert all(t["capas"] == [("Adobe", 0.2)] and t["epw"].endswith(epw) for t in trabajos)
+
+    csv = f"epw,capas,absortancia,aire,Nx\n{epw},Adobe:0.2|Ladrillo:0.1,0.5,si,rapido\n"
+    [trabajo] = normalizar(leer_entradas(csv, "csv"))
+    assert trabajo["capas"] == [("Adobe", 0.2), ("Ladrillo", 0.1)] and trabajo["aire"] is True
+    assert trabajo["absortancia"] == 0.5 and trabajo["Nx"] == 50
+
+    # 10^8 combinaciones: debe rechazarse en cuanto pasa del máximo
+    enorme = {"epw": epw, "capas": [["Adobe", 0.2]], "absortancia": [0.5] * 10_000, "azimuth": list(range(10_000))}
+    inicio = time.perf_counter()
+    try:
+        normalizar([enorme], maximo=10)
+    except ValueError:
+        assert time.perf_counter() - inicio < 5
+    else:
+        raise AssertionError("normalizar aceptó un lote mayor que el máximo")
+
+    for invalido in ({"epw": epw, "capas": [["Inexistente", 0.1]]}, {"epw": epw, "capas": [["Adobe", 0.1]], "absortancia": 2},
+                     {"epw": "no-existe.epw", "capas": [["Adobe", 0.1]]}, {"epw": epw}):
+        try:
+            normalizar([invalido])
+        except ValueError:
+            continue
+        raise AssertionError(f"normalizar aceptó {invalido}")
+
+
+def verificar() -> int:
+    """Corre todas las comprobaciones. Regresa el número de fallas."""
+    fallas = 0
+    for definicion in COMPROBACIONES:
+        inicio = time.perf_counter()
+        try:
+            definicion["funcion"]()
+        except Exception:
+            fallas += 1
+            print(f"{definicion['nombre']:<40} FALLA", flush=True)
+            traceback.print_exc()
+            continue
+        print(f"{definicion['nombre']:<40} ok ({time.perf_counter() - inicio:.2f} s)", flush=True)
+    return fallas
+
+
+if __name__ == "__main__":
+    sys.exit(1 if verificar() else 0)
@@ -0,0 +1,310 @@
+# utils/almacen.py
+# -*- coding: utf-8 -*-
+"""
+Almacén columnar de días promedio.
+Cada EPW se guarda, por hash de contenido, como un directorio con:
+    meta.json        -> encabezado del EPW (ciudad, coordenadas, zona horaria), columnas
+                        y versión del cálculo (enerhabitat y commit de la app)
+    <año>-<mes>.npy  -> arreglo float64 (filas, columnas) del meanDay del mes
+Los .npy se abren con memoria mapeada en modo solo lectura, así que todas las
+sesiones y procesos del servidor comparten las mismas páginas del sistema operativo.
+El almacén se acota a MAX_ALMACEN_MB: al escribir se borran primero los meses
+de años pasados y luego los EPW usados hace más tiempo (la fecha de meta.json
+marca el último uso). Los EPW precargados nunca se borran.
+Antes de repartir meses entre procesos se escribe el meta.json (`preparar_epw`),
+y un meta faltante nunca borra meses: sólo otra versión u otras columnas.
+Uso:
+    python -m utils.almacen            # compila los EPW precargados
+    python -m utils.almacen otro.epw   # compila archivos específicos
+"""
+
+from __future__ import annotations
+import json
+import os
+import shutil
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import enerhabitat as eh
+
+from utils.card import PRECARGADOS_DIR, meses
+
+ALMACEN_DIR = "./data/almacen/"
+VERSION_ALMACEN = 2
+DIA = "15"  # Día que usa Location.meanDay por defecto
+# Límite configurable por variable de entorno, como EH_PROCESOS (~7 MB por mes)
+MAX_ALMACEN_MB = float(os.environ.get("EH_ALMACEN_MB", 2048))
+
+
+def _dir_epw(epw_hash: str) -> Path:
+    return Path(ALMACEN_DIR) / epw_hash
+
+
+def _escribir_atomico(destino: Path, escribir):
+    """Escribe en un temporal y lo renombra para que nadie lea archivos a medias."""
+    temporal = destino.with_name(f".{destino.name}.{os.getpid()}.tmp")
+    escribir(temporal)
+    os.replace(temporal, destino)
+
+
+def _archivo_mes(epw_hash: str, mes: str, year: int) -> Path:
+    return _dir_epw(epw_hash) / f"{year}-{mes}.npy"
+
+
+def _version() -> str:
+    # La misma que la de los resultados: otro enerhabitat o build puede dar otro meanDay
+    from utils.cache import version_calculo
+
+    return version_calculo()
+
+
+def _leer_meta(epw_hash: str) -> dict | None:
+    """meta.json tal cual, de cualquier versión; None si falta o está dañado."""
+    try:
+        with open(_dir_epw(epw_hash) / "meta.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _vigente(meta: dict) -> bool:
+    return meta.get("version") == VERSION_ALMACEN and meta.get("calculo") == _version()
+
+
+def _meta_vigente(epw_hash: str) -> dict | None:
+    meta = _leer_meta(epw_hash)
+    if meta is None or not _vigente(meta) or not meta.get("columnas"):
+        return None
+    return meta
+
+
+def mes_compilado(epw_hash: str, mes: str, year: int) -> bool:
+    """True si el meanDay del mes ya está en el almacén."""
+    return _archivo_mes(epw_hash, mes, year).exists() and _meta_vigente(epw_hash) is not None
+
+
+def preparar_epw(epw_hash: str, location, columnas: list | None = None, filas: int | None = None) -> dict:
+    """
+    Deja meta.json vigente antes de escribir meses; se llama una vez antes de
+    repartir meses entre procesos y de nuevo por cada mes (sin costo si ya está).
+    Los .npy sólo se borran si el meta existente es de otra versión o tiene otras
+    columnas. Si el meta falta no se borra nada: esos meses pueden ser de otro
+    proceso que preparó el mismo EPW al mismo tiempo.
+    """
+    directorio = _dir_epw(epw_hash)
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    meta = _leer_meta(epw_hash)
+    if meta is not None and _vigente(meta):
+        if columnas is None or meta.get("columnas") == columnas:
+            return meta
+        if meta.get("columnas") is None:
+            # Meta preparado sin columnas: el primer mes las completa
+            meta = dict(meta, columnas=columnas, filas=filas)
+            _escribir_atomico(
+                directorio / "meta.json",
+                lambda p: p.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8"),
+            )
+            return meta
+
+    if meta is not None:
+        # Otra versión u otras columnas: sus meses ya no valen
+        for viejo in directorio.glob("*.npy"):
+            viejo.unlink(missing_ok=True)
+    meta = {
+        "version": VERSION_ALMACEN,
+        "calculo": _version(),
+        "ciudad": location.city,
+        "latitud": location.latitude,
+        "longitud": location.longitude,
+        "altitud": location.altitude,
+        "zona_horaria": str(location.timezone),
+        "columnas": columnas,
+        "filas": filas,
+    }
+    _escribir_atomico(
+        directorio / "meta.json",
+        lambda p: p.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8"),
+    )
+    return meta
+
+
+def guardar_dia_promedio(epw_hash: str, location, mes: str, year: int, df: pd.DataFrame) -> bool:
+    """
+    Guarda el meanDay de un mes en el almacén.
+    Regresa False si el almacén no se puede escribir (p. ej. disco de solo lectura).
+    """
+    try:
+        preparar_epw(epw_hash, location, list(df.columns), len(df))
+        datos = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+
+        def _guardar(p):
+            with open(p, "wb") as f:
+                np.save(f, datos)
+
+        _escribir_atomico(_archivo_mes(epw_hash, mes, year), _guardar)
+        recortar()
+        return True
+    except OSError:
+        return False
+
+
+def _protegidos() -> set[str]:
+    """Hashes de los EPW precargados."""
+    from utils.cache import hash_epw
+
+    try:
+        archivos = [os.path.join(PRECARGADOS_DIR, a) for a in os.listdir(PRECARGADOS_DIR)]
+    except OSError:
+        return set()
+    return {hash_epw(a) for a in archivos if os.path.isfile(a)}
+
+
+def recortar(max_bytes: float | None = None) -> int:
+    """
+    Deja el almacén en 90 % de `max_bytes` si lo supera. Regresa los bytes borrados.
+    Borrar un .npy abierto con memoria mapeada no afecta a quien ya lo tiene abierto.
+    """
+    max_bytes = MAX_ALMACEN_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    vigente = f"{date.today().year}-"
+    directorios = []  # [uso, hash, ruta, bytes, [(ruta, bytes) de años pasados]]
+    try:
+        for entrada in os.scandir(ALMACEN_DIR):
+            if not entrada.is_dir():
+                continue
+            archivos = [(a.path, a.name, a.stat().st_size) for a in os.scandir(entrada.path)]
+            try:
+                uso = os.stat(os.path.join(entrada.path, "meta.json")).st_mtime
+            except OSError:
+                uso = 0.0
+            pasados = [(ruta, tam) for ruta, nombre, tam in archivos
+                       if nombre.endswith(".npy") and not nombre.startswith(vigente)]
+            directorios.append([uso, entrada.name, entrada.path, sum(a[2] for a in archivos), pasados])
+    except OSError:
+        return 0
+    total = sum(d[3] for d in directorios)
+    if total <= max_bytes:
+        return 0
+    objetivo = max_bytes * 0.9
+    inicial = total
+
+    # Primero los meses de años pasados: ya nadie los pide
+    for directorio in directorios:
+        for ruta, tam in directorio[4]:
+            if total <= objetivo:
+                return inicial - total
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tam
+            directorio[3] -= tam
+
+    protegidos = _protegidos()
+    for _, epw_hash, ruta, tam, _ in sorted(directorios):
+        if total <= objetivo:
+            break
+        if epw_hash not in protegidos:
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tam
+    return inicial - total
+
+class LocacionAlmacenada(eh.Location):
+    """
+    Location cuyo meanDay del mes compilado se lee del almacén (memoria mapeada)
+    en lugar de recalcularse. Para cualquier otra fecha se comporta como eh.Location.
+    """
+
+    def __init__(self, epw_file: str, mes: str, year: int, datos: np.ndarray, columnas: list):
+        super().__init__(epw_file)
+        self._mes = str(mes)
+        self._year = str(year)
+        self._almacenado = True
+
+        inicio = pd.Timestamp(f"{self._year}-{self._mes}-{DIA} 00:00")
+        indice = pd.date_range(start=inicio, periods=datos.shape[0], freq="1s", tz=self.timezone)
+        # float64 exacto: con float32 el máximo de Ta se movía unos segundos y
+        # cambiaba el minuto de TR. Sin copia, las páginas siguen compartidas.
+        self._df = pd.DataFrame(datos, index=indice, columns=columnas, copy=False)
+
+    def meanDay(self, day="15", month="current", year="current"):
+        if (str(day), str(month), str(year)) == (DIA, self._mes, self._year):
+            self._almacenado = True
+            return self._df
+        self._almacenado = False
+        return super().meanDay(day=day, month=month, year=year)
+
+    def flag(self):
+        if not self._almacenado:
+            return super().flag()
+        return {
+            "recalculate": False,
+            "date": f"{DIA}-{self._mes}-{self._year}",
+            "day": DIA,
+            "month": self._mes,
+            "year": self._year,
+        }
+
+
+def abrir_locacion(epw_file: str, epw_hash: str, mes: str, year: int):
+    """
+    Regresa (Location, meanDay) desde el almacén, o None si el mes no está compilado.
+    """
+    meta = _meta_vigente(epw_hash)
+    if meta is None:
+        return None
+    try:
+        datos = np.load(_archivo_mes(epw_hash, mes, year), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if datos.shape != (meta["filas"], len(meta["columnas"])):
+        return None
+    try:
+        os.utime(_dir_epw(epw_hash) / "meta.json")  # Último uso, para recortar()
+    except OSError:
+        pass
+
+    location = LocacionAlmacenada(epw_file, mes, year, datos, meta["columnas"])
+    return location, location.meanDay(day=DIA, month=str(mes), year=str(year))
+
+
+def compilar_epw(epw_file: str, year: int | None = None) -> int:
+    """
+    Compila los 12 meanDay de un EPW para el año indicado (por defecto el actual).
+    Regresa el número de meses escritos.
+    """
+    from utils.cache import hash_epw
+
+    year = year or date.today().year
+    epw_hash = hash_epw(epw_file)
+    escritos = 0
+    for mes in meses:
+        if mes_compilado(epw_hash, mes, year):
+            continue
+        location = eh.Location(epw_file=epw_file)
+        df = location.meanDay(month=mes, year=year)
+        if guardar_dia_promedio(epw_hash, location, mes, year, df):
+            escritos += 1
+    return escritos
+
+
+def compilar_precargados() -> dict:
+    """Compila todos los EPW de PRECARGADOS_DIR."""
+    resumen = {}
+    for archivo in sorted(os.listdir(PRECARGADOS_DIR)):
+        ruta = os.path.join(PRECARGADOS_DIR, archivo)
+        if os.path.isfile(ruta) and archivo.lower().endswith(".epw"):
+            resumen[archivo] = compilar_epw(ruta)
+    return resumen
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        resumen = {archivo: compilar_epw(archivo) for archivo in sys.argv[1:]}
+    else:
+        resumen = compilar_precargados()
+    for archivo, escritos in resumen.items():
+        print(f"{archivo}: {escritos} meses compilados")
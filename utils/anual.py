@@ -0,0 +1,107 @@
+# utils/anual.py
+# -*- coding: utf-8 -*-
+"""
+Corridas de los 12 meses.
+Cada sistema constructivo se resuelve con el día promedio de cada mes; las
+energías del día promedio se escalan por los días del mes para obtener
+totales mensuales y anuales, y FD/TR se promedian por estación (TR con media
+circular: es un retraso módulo 24 h, así que 23:30 y 00:30 promedian 00:00).
+Uso:
+    trabajos, indice = trabajos_anuales(trabajos)
+    mensual = tabla_mensual(indice, resultados, etiquetas)   # etiquetas[sc_id - 1]
+    resumen = resumen_anual(mensual)
+"""
+
+from __future__ import annotations
+import calendar
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils.card import meses
+from utils.metricas import horas_tr
+
+ESTACIONES = {
+    "Invierno": ["12", "01", "02"],
+    "Primavera": ["03", "04", "05"],
+    "Verano": ["06", "07", "08"],
+    "Otoño": ["09", "10", "11"],
+}
+
+
+def dias_mes(mes: str, year: int | None = None) -> int:
+    """Días del mes en el año indicado (por defecto el actual, como meanDay)."""
+    return calendar.monthrange(year or date.today().year, int(mes))[1]
+
+
+def trabajos_anuales(trabajos: list[dict]) -> tuple[list[dict], dict]:
+    """
+    Repite cada trabajo para los 12 meses con un sc_id único por (mes, sistema).
+    Regresa (trabajos, indice) con indice[sc_id] = (mes, sc_id original).
+    """
+    nuevos = []
+    indice = {}
+    for mes in meses:
+        for trabajo in trabajos:
+            sc_id = len(nuevos) + 1
+            nuevos.append(dict(trabajo, sc_id=sc_id, mes=mes))
+            indice[sc_id] = (mes, trabajo["sc_id"])
+    return nuevos, indice
+
+
+def media_circular(horas: pd.Series) -> float:
+    """Promedio de horas del día como ángulos; regresa un valor en [0, 24)."""
+    angulos = np.asarray(horas, dtype=np.float64) * (2 * np.pi / 24)
+    media = np.arctan2(np.sin(angulos).mean(), np.cos(angulos).mean())
+    # Redondear antes del módulo para que -1e-15 no dé 24 en lugar de 0
+    return float(np.mod(np.round(media * 24 / (2 * np.pi), 9), 24))
+
+
+def tabla_mensual(indice: dict, resultados: list[dict], etiquetas: list[str]) -> pd.DataFrame:
+    """
+    Una fila por (mes, sistema) con las métricas del día promedio y las
+    energías totales del mes.
+    """
+    filas = []
+    for resultado in resultados:
+        mes, sc_id = indice[resultado["sc_id"]]
+        m = resultado["metricas"]
+        dias = dias_mes(mes)
+        fila = {
+            "Mes": meses[mes],
+            "mes": mes,
+            "SC": f"SC {sc_id}",
+            "Sistema": etiquetas[sc_id - 1],
+            "FD": m["FD"],
+            "TR [h]": horas_tr(m["TR"]),
+        }
+        for clave in ("Eenf", "Ecal", "Etotal", "ET"):
+            fila[f"{clave} [Wh/m²]"] = None if m[clave] is None else m[clave] * dias
+        filas.append(fila)
+    return pd.DataFrame(filas).sort_values(["mes", "SC"]).reset_index(drop=True)
+
+
+def con_aire(mensual: pd.DataFrame) -> bool:
+    """True si la tabla mensual viene de una corrida con AC."""
+    return bool(mensual["Etotal [Wh/m²]"].notna().all())
+
+
+def resumen_anual(mensual: pd.DataFrame) -> pd.DataFrame:
+    """Totales anuales de energía (con AC) o promedios estacionales de FD y TR (sin AC)."""
+    if con_aire(mensual):
+        energias = ["Eenf [Wh/m²]", "Ecal [Wh/m²]", "Etotal [Wh/m²]"]
+        return mensual.groupby(["SC", "Sistema"])[energias].sum().reset_index()
+
+    estacion = {mes: nombre for nombre, lista in ESTACIONES.items() for mes in lista}
+    datos = mensual.assign(Estación=mensual["mes"].map(estacion))
+    resumen = datos.pivot_table(
+        index=["SC", "Sistema"],
+        columns="Estación",
+        values=["FD", "TR [h]"],
+        aggfunc={"FD": "mean", "TR [h]": media_circular},
+    )
+    resumen = resumen.reindex(columns=[(m, e) for m in ("FD", "TR [h]") for e in ESTACIONES])
+    resumen.columns = [f"{metrica} {est}" for metrica, est in resumen.columns]
+    resumen["ET anual [Wh/m²]"] = mensual.groupby(["SC", "Sistema"])["ET [Wh/m²]"].sum()
+    return resumen.reset_index()
@@ -0,0 +1,143 @@
+# utils/api.py
+# -*- coding: utf-8 -*-
+"""
+Endpoint HTTP para simulaciones por lote, montado junto a la app de Shiny.
+    POST /api/simular               cuerpo JSON o CSV (Content-Type: text/csv)
+         ?formato=ndjson|parquet    NDJSON en streaming (por defecto) o Parquet
+         ?series=1                  incluir Tsa y Ti de cada sistema
+    GET  /metrics                   tiempos por etapa, cachés y memoria en formato Prometheus
+Sólo acepta los EPW precargados, por nombre de archivo, para no abrir
+rutas arbitrarias del servidor. El formato del lote es el de utils.lote.
+Las rutas sólo se montan con EH_API=1 y atienden a clientes locales
+(127.0.0.1, ::1) o, si se define EH_API_TOKEN, a quien mande
+`Authorization: Bearer <token>`. Cada petición admite a lo más
+MAX_TRABAJOS_API sistemas, porque comparten el pool con las sesiones.
+"""
+
+from __future__ import annotations
+import asyncio
+import functools
+import hmac
+import os
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from utils import trazas
+from utils.barrido import MAX_CELDAS
+from utils.cache import estadisticas
+from utils.card import PRECARGADOS_DIR
+from utils.lote import FORMATOS, normalizar, leer_entradas, fila_resultado, linea_ndjson, parquet_bytes, requiere_pyarrow
+from utils.memoria import presupuesto
+from utils.motor import resolver_sistemas_async
+
+MAX_CUERPO = 5 * 1024 * 1024  # Tamaño máximo del archivo de trabajos (bytes)
+# Configurables por variable de entorno, como EH_PROCESOS
+ACTIVA = os.environ.get("EH_API", "0") == "1"
+TOKEN = os.environ.get("EH_API_TOKEN", "")
+MAX_TRABAJOS_API = int(os.environ.get("EH_API_TRABAJOS", MAX_CELDAS))
+LOCALES = ("127.0.0.1", "::1", "localhost")
+
+
+class CuerpoGrande(ValueError):
+    pass
+
+
+def _autorizado(request: Request) -> bool:
+    if TOKEN:
+        return hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {TOKEN}")
+    return request.client is not None and request.client.host in LOCALES
+
+
+def protegida(funcion):
+    """Responde 403 a quien no sea local ni traiga el token."""
+    @functools.wraps(funcion)
+    async def envoltura(request: Request):
+        if not _autorizado(request):
+            return JSONResponse({"error": "Acceso restringido."}, status_code=403)
+        return await funcion(request)
+    return envoltura
+
+
+async def _leer_cuerpo(request: Request, maximo: int = MAX_CUERPO) -> bytes:
+    """Lee el cuerpo sin pasar de `maximo` bytes, aunque mienta Content-Length."""
+    try:
+        declarado = int(request.headers.get("content-length", 0))
+    except ValueError:
+        declarado = 0
+    if declarado > maximo:
+        raise CuerpoGrande
+    partes, total = [], 0
+    async for parte in request.stream():
+        total += len(parte)
+        if total > maximo:
+            raise CuerpoGrande
+        partes.append(parte)
+    return b"".join(partes)
+
+
+def _epw_precargado(nombre: str) -> str:
+    ruta = os.path.join(PRECARGADOS_DIR, os.path.basename(str(nombre)))
+    if not os.path.isfile(ruta):
+        raise ValueError(f"EPW no disponible: {nombre}")
+    return ruta
+
+
+@protegida
+async def simular(request: Request):
+    formato = request.query_params.get("formato", "ndjson")
+    series = request.query_params.get("series") in ("1", "true")
+    if formato not in FORMATOS:
+        return JSONResponse({"error": f"Formato inválido: {formato}"}, status_code=400)
+
+    try:
+        cuerpo = await _leer_cuerpo(request)
+    except CuerpoGrande:
+        return JSONResponse({"error": "El archivo de trabajos es demasiado grande."}, status_code=413)
+    tipo = "csv" if "csv" in request.headers.get("content-type", "") else "json"
+    try:
+        if formato == "parquet":
+            requiere_pyarrow()
+        trabajos = normalizar(leer_entradas(cuerpo, tipo), resolver_epw=_epw_precargado, maximo=MAX_TRABAJOS_API)
+    except (ValueError, TypeError, KeyError, RuntimeError) as error:
+        return JSONResponse({"error": str(error)}, status_code=400)
+    por_id = {t["sc_id"]: t for t in trabajos}
+
+    if formato == "parquet":
+        resultados = await resolver_sistemas_async(trabajos)
+        filas = [fila_resultado(por_id[r["sc_id"]], r, series) for r in resultados]
+        return Response(
+            parquet_bytes(filas),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": 'attachment; filename="enerhabitat-lote.parquet"'},
+        )
+
+    # NDJSON: una línea por sistema conforme termina
+    async def lineas():
+        cola = asyncio.Queue()
+        tarea = asyncio.ensure_future(resolver_sistemas_async(trabajos, avance=cola.put_nowait))
+        tarea.add_done_callback(lambda _: cola.put_nowait(None))
+        try:
+            while (resultado := await cola.get()) is not None:
+                yield linea_ndjson(fila_resultado(por_id[resultado["sc_id"]], resultado, series))
+            if tarea.exception() is not None:
+                yield linea_ndjson({"error": str(tarea.exception())})
+        finally:
+            tarea.cancel()  # El cliente se desconectó: no seguir resolviendo
+
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
+
+
+@protegida
+async def metricas(request: Request):
+    return PlainTextResponse(
+        trazas.prometheus(estadisticas(), presupuesto.medidas()),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+rutas = [
+    Route("/api/simular", simular, methods=["POST"]),
+    Route("/metrics", metricas, methods=["GET"]),
+] if ACTIVA else []
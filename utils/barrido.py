@@ -0,0 +1,107 @@
+# utils/barrido.py
+# -*- coding: utf-8 -*-
+"""
+Barridos paramétricos sobre un sistema constructivo base.
+Se varían hasta dos parámetros (ancho de una capa, absortancia o material de
+una capa) y cada combinación se resuelve como un trabajo del motor, así que el
+barrido aprovecha el pool de procesos, la Tsa compartida y la caché de resultados.
+Uso:
+    celdas, trabajos = generar_trabajos(base, capa, ejes)
+    tabla = tabla_barrido(celdas, resultados)
+"""
+
+from __future__ import annotations
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from utils.metricas import horas_tr
+
+MAX_CELDAS = 400  # Número máximo de combinaciones por barrido
+
+EJES = {
+    "ancho": "Ancho de capa (m)",
+    "absortancia": "Absortancia",
+    "material": "Material de capa",
+}
+
+METRICAS = {
+    "FD": "FD [-]",
+    "FDsa": "FDsa [-]",
+    "TR": "TR [h]",
+    "ET": "ET [Wh/m²]",
+    "Eenf": "Eenf [Wh/m²]",
+    "Ecal": "Ecal [Wh/m²]",
+    "Etotal": "Etotal [Wh/m²]",
+    "Timax": "Ti máxima [°C]",
+    "Hconf": "Horas en confort [h]",
+    "GHsup": "Grados-hora sobre confort [°C·h]",
+    "GHinf": "Grados-hora bajo confort [°C·h]",
+}
+
+
+def rango(minimo: float, maximo: float, pasos: int, decimales: int = 3) -> list[float]:
+    """Valores equiespaciados entre minimo y maximo (incluidos)."""
+    pasos = max(int(pasos), 1)
+    if pasos == 1:
+        return [round(float(minimo), decimales)]
+    return [round(float(v), decimales) for v in np.linspace(minimo, maximo, pasos)]
+
+
+def generar_trabajos(base: dict, capa: int, ejes: dict) -> tuple[list[dict], list[dict]]:
+    """
+    Genera un trabajo por combinación de los valores de `ejes`.
+
+    base = trabajo del motor con el sistema de referencia (sin sc_id)
+    capa = número de capa (1 = exterior) que modifican los ejes ancho y material
+    ejes = {"ancho": [...], "absortancia": [...], "material": [...]} (uno o dos)
+
+    Regresa (celdas, trabajos): celdas[i] tiene los valores de los ejes del trabajo i.
+    """
+    if not 1 <= len(ejes) <= 2:
+        raise ValueError("El barrido necesita uno o dos ejes.")
+    if not 1 <= capa <= len(base["capas"]):
+        raise ValueError(f"La capa {capa} no existe en el sistema base.")
+
+    nombres = list(ejes)
+    valores_eje = [list(dict.fromkeys(ejes[n])) for n in nombres]  # Sin repetidos
+    combinaciones = list(product(*valores_eje))
+    if len(combinaciones) > MAX_CELDAS:
+        raise ValueError(f"El barrido tiene {len(combinaciones)} combinaciones; el máximo es {MAX_CELDAS}.")
+
+    celdas = []
+    trabajos = []
+    for sc_id, valores in enumerate(combinaciones, 1):
+        celda = dict(zip(nombres, valores))
+        capas = list(base["capas"])
+        material, ancho = capas[capa - 1]
+        capas[capa - 1] = (celda.get("material", material), float(celda.get("ancho", ancho)))
+
+        trabajo = dict(base, sc_id=sc_id, capas=capas)
+        if "absortancia" in celda:
+            trabajo["absortancia"] = float(celda["absortancia"])
+
+        celdas.append(celda)
+        trabajos.append(trabajo)
+    return celdas, trabajos
+
+
+def tabla_barrido(celdas: list[dict], resultados: list[dict]) -> pd.DataFrame:
+    """Tabla larga con los valores de los ejes y las métricas de cada combinación."""
+    filas = []
+    for celda, resultado in zip(celdas, resultados):
+        fila = dict(celda)
+        for clave, valor in resultado["metricas"].items():
+            fila[clave] = horas_tr(valor) if clave == "TR" else valor
+        filas.append(fila)
+    return pd.DataFrame(filas)
+
+
+def matriz_barrido(tabla: pd.DataFrame, metrica: str) -> pd.DataFrame:
+    """Matriz (eje y × eje x) de una métrica para el mapa de calor."""
+    ejes = [c for c in tabla.columns if c in EJES]
+    if len(ejes) == 1:
+        return tabla.set_index(ejes[0])[[metrica]].T
+    eje_x, eje_y = ejes
+    return tabla.pivot(index=eje_y, columns=eje_x, values=metrica)
@@ -0,0 +1,365 @@
+# utils/cache.py
+# -*- coding: utf-8 -*-
+"""
+Cachés compartidas por todas las sesiones del proceso.
+Los EPW se identifican por el hash de su contenido, de modo que el mismo
+archivo (precargado o subido por distintos usuarios) se procesa una sola vez.
+Detrás de la memoria está el almacén columnar (utils.almacen), compartido
+entre procesos y reinicios.
+Las soluciones de cada sistema constructivo se guardan en `resultados`, una
+LRU en memoria respaldada por una base SQLite de tamaño acotado que comparten
+todos los workers, de modo que uno nuevo o reiniciado arranca con la caché llena.
+Uso:
+    from utils.cache import dia_promedio, resultados
+    location, df = dia_promedio(epw_file, mes)
+    solucion = resultados.get(clave)
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from importlib.metadata import version
+
+from utils import trazas
+
+MAX_DIAS_PROMEDIO = 32  # Número máximo de pares (EPW, mes) en memoria
+MAX_RESULTADOS = 256  # Soluciones de sistemas constructivos en memoria
+MAX_DISCO_MB = 512  # Tamaño máximo del nivel en disco de los resultados
+CACHE_DB = "./data/cache/resultados.sqlite"
+ESPERA_DB = 30  # Segundos que se espera a que otro proceso suelte la base
+RECONTAR_CADA = 100  # Escrituras entre recuentos del tamaño de la base (otros procesos también escriben)
+
+
+_version_calculo: str | None = None
+
+
+def version_calculo() -> str:
+    """
+    Versión de enerhabitat y commit de la app. Lo guardado en disco (resultados
+    y almacén) sólo vale para la misma versión. Se calcula al primer uso, no al
+    importar, para que los procesos del pool no busquen el build.
+    """
+    global _version_calculo
+    if _version_calculo is None:
+        _version_calculo = f"{version('enerhabitat')}+{trazas.build()[0]}"
+    return _version_calculo
+
+
+class LRUCache:
+    """
+    Diccionario acotado con política LRU, seguro entre hilos.
+    Lleva contadores de aciertos y fallos para diagnóstico.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._datos: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                return self._datos[clave]
+            self.misses += 1
+            return default
+
+    def peek(self, clave, default=None):
+        """Como get, pero sin contar en las estadísticas ni marcar el uso."""
+        with self._lock:
+            return self._datos.get(clave, default)
+
+    def put(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, clave):
+        with self._lock:
+            return clave in self._datos
+
+    def valores(self) -> list:
+        """Copia de los valores, sin contar como uso."""
+        with self._lock:
+            return list(self._datos.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._datos),
+                "maxsize": self.maxsize,
+            }
+
+
+class CacheEnDisco:
+    """
+    LRU en memoria delante de una base SQLite compartida por todos los procesos
+    del servidor (workers de uvicorn incluidos) y que sobrevive a reinicios.
+    Cada fila lleva la versión del cálculo (version_calculo): las de otra versión
+    nunca se leen y son las primeras en borrarse. Al superar `max_bytes` se
+    borran las usadas hace más tiempo. Cada escritura es una transacción, así
+    que otro proceso nunca ve un valor a medias.
+    El tamaño de la base se lleva como un total estimado que se recuenta cada
+    RECONTAR_CADA escrituras (o al superar el límite), no en cada `put`.
+    """
+
+    def __init__(self, maxsize: int, ruta: str, max_bytes: int, version: str | None = None):
+        self.memoria = LRUCache(maxsize)
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self._version = version
+        self.disco_hits = 0
+        self.disco_misses = 0
+        self._total = None  # Bytes estimados en la base de `_total_ruta`; None = recontar
+        self._total_ruta = None
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Una conexión por hilo
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            self._version = version_calculo()
+        return self._version
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None or self._local.ruta != self.ruta:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=ESPERA_DB, isolation_level=None)
+            # WAL: los lectores no bloquean al proceso que escribe
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS resultados ("
+                "clave TEXT PRIMARY KEY, version TEXT, valor BLOB, tamano INTEGER, uso REAL)"
+            )
+            self._local.conexion, self._local.ruta = conexion, self.ruta
+        return conexion
+
+    def get(self, clave: str, default=None):
+        valor = self.memoria.get(clave)
+        if valor is not None:
+            return valor
+
+        try:
+            conexion = self._conexion()
+            fila = conexion.execute(
+                "SELECT valor FROM resultados WHERE clave = ? AND version = ?", (clave, self.version)
+            ).fetchone()
+            if fila is not None:
+                valor = pickle.loads(fila[0])
+                conexion.execute("UPDATE resultados SET uso = ? WHERE clave = ?", (time.time(), clave))
+        except (sqlite3.Error, OSError, pickle.UnpicklingError, EOFError):
+            valor = None
+
+        with self._lock:
+            if valor is None:
+                self.disco_misses += 1
+            else:
+                self.disco_hits += 1
+        if valor is None:
+            return default
+        self.memoria.put(clave, valor)
+        return valor
+
+    def contiene(self, clave: str) -> bool:
+        """
+        True si hay un valor para `clave`, sin contar en las estadísticas ni
+        marcar el uso (para consultas que no son un uso real, como la vista previa).
+        """
+        if self.memoria.peek(clave) is not None:
+            return True
+        try:
+            fila = self._conexion().execute(
+                "SELECT 1 FROM resultados WHERE clave = ? AND version = ?", (clave, self.version)
+            ).fetchone()
+        except (sqlite3.Error, OSError):
+            return False
+        return fila is not None
+
+    def put(self, clave: str, valor):
+        self.memoria.put(clave, valor)
+        datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            conexion = self._conexion()
+            conexion.execute(
+                "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)",
+                (clave, self.version, datos, len(datos), time.time()),
+            )
+            with self._lock:
+                self._escrituras += 1
+                if self._total is None or self._total_ruta != self.ruta or self._escrituras % RECONTAR_CADA == 0:
+                    estimado = None
+                else:
+                    # Sobrestima si la clave ya existía; el recuento lo corrige
+                    estimado = self._total = self._total + len(datos)
+            if estimado is None or estimado > self.max_bytes:
+                total = self._recortar(conexion)
+                with self._lock:
+                    self._total, self._total_ruta = total, self.ruta
+        except (sqlite3.Error, OSError):
+            pass  # El nivel en disco es opcional
+
+    def _recortar(self, conexion: sqlite3.Connection) -> int:
+        """Recuenta el tamaño de la base y la recorta si supera el límite. Regresa el tamaño final."""
+        total = conexion.execute("SELECT COALESCE(SUM(tamano), 0) FROM resultados").fetchone()[0]
+        if total <= self.max_bytes:
+            return total
+        # Primero otras versiones, luego las más viejas, hasta quedar en 90 % del límite
+        conexion.execute(
+            "DELETE FROM resultados WHERE clave IN ("
+            " SELECT clave FROM ("
+            "  SELECT clave, SUM(tamano) OVER (ORDER BY version = ?, uso ROWS UNBOUNDED PRECEDING) - tamano AS previo"
+            "  FROM resultados"
+            " ) WHERE previo < ?"
+            ")",
+            (self.version, total - self.max_bytes * 0.9),
+        )
+        return conexion.execute("SELECT COALESCE(SUM(tamano), 0) FROM resultados").fetchone()[0]
+
+    def clear(self):
+        """Vacía la memoria y la base (afecta a todos los procesos)."""
+        self.memoria.clear()
+        with self._lock:
+            self._total = None
+        try:
+            self._conexion().execute("DELETE FROM resultados")
+        except (sqlite3.Error, OSError):
+            pass
+
+    def stats(self) -> dict:
+        datos = self.memoria.stats()
+        with self._lock:
+            aciertos = datos["hits"] + self.disco_hits
+            consultas = datos["hits"] + datos["misses"]
+            datos.update(
+                disco_hits=self.disco_hits,
+                disco_misses=self.disco_misses,
+                hit_rate_total=aciertos / consultas if consultas else 0.0,
+            )
+        return datos
+
+
+resultados = CacheEnDisco(MAX_RESULTADOS, CACHE_DB, MAX_DISCO_MB * 1024 * 1024)
+
+
+# (ruta, mtime, tamaño) -> hash, para no releer archivos sin cambios
+_hashes: dict[tuple, str] = {}
+_hashes_lock = threading.Lock()
+
+
+def hash_epw(epw_file: str) -> str:
+    """
+    Devuelve el SHA-256 del contenido del EPW.
+    El resultado se memoriza por ruta, fecha de modificación y tamaño.
+    """
+    st = os.stat(epw_file)
+    firma = (os.path.abspath(epw_file), st.st_mtime_ns, st.st_size)
+    with _hashes_lock:
+        if firma in _hashes:
+            return _hashes[firma]
+
+    h = hashlib.sha256()
+    with open(epw_file, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    digest = h.hexdigest()
+
+    with _hashes_lock:
+        _hashes[firma] = digest
+    return digest
+
+
+_dias_promedio = LRUCache(MAX_DIAS_PROMEDIO)
+
+# Un candado por clave para que dos sesiones no calculen lo mismo a la vez
+_calculando: dict[tuple, threading.Lock] = {}
+_calculando_lock = threading.Lock()
+
+
+def dia_promedio(epw_file: str, mes: str):
+    """
+    Regresa (Location, meanDay) para el EPW y mes indicados.
+    Ambos objetos se comparten entre sesiones: no deben modificarse.
+    """
+    epw_hash = hash_epw(epw_file)
+    year = date.today().year
+    clave = (epw_hash, str(mes), year)
+
+    resultado = _dias_promedio.get(clave)
+    if resultado is not None:
+        return resultado
+
+    with _calculando_lock:
+        lock = _calculando.setdefault(clave, threading.Lock())
+
+    with lock:
+        # Otro hilo pudo haberlo calculado mientras esperábamos
+        if clave in _dias_promedio:
+            return _dias_promedio.get(clave)
+
+        try:
+            # El almacén y enerhabitat se cargan con el primer meanDay, no al arrancar
+            import enerhabitat as eh
+            from utils import almacen
+
+            with trazas.medir("almacen"):
+                resultado = almacen.abrir_locacion(epw_file, epw_hash, mes, year)
+            if resultado is None:
+                with trazas.medir("epw"):
+                    location = eh.Location(epw_file=epw_file)
+                with trazas.medir("meanday"):
+                    df = location.meanDay(month=mes, year=year)
+                almacen.guardar_dia_promedio(epw_hash, location, mes, year, df)
+                resultado = (location, df)
+            _dias_promedio.put(clave, resultado)
+        finally:
+            # Se suelta con el valor ya publicado: quien llegue tarde lo encuentra
+            # en la LRU en vez de crear otro candado y calcularlo de nuevo
+            with _calculando_lock:
+                _calculando.pop(clave, None)
+
+    return resultado
+
+
+def dia_disponible(epw_file: str, mes: str) -> bool:
+    """True si el meanDay ya está en memoria o en el almacén (no hay que calcularlo)."""
+    from utils import almacen
+
+    epw_hash = hash_epw(epw_file)
+    year = date.today().year
+    return (epw_hash, str(mes), year) in _dias_promedio or almacen.mes_compilado(epw_hash, mes, year)
+
+
+def estadisticas() -> dict:
+    """Contadores de aciertos y fallos de las cachés del proceso."""
+    return {
+        "dia_promedio": _dias_promedio.stats(),
+        "resultados": resultados.stats(),
+    }
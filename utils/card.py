@@ -1,14 +1,17 @@
 from shiny import ui
-import enerhabitat as eh
+import configparser
 import os
-import base64
-from pathlib import Path
+
+from utils.barrido import EJES, METRICAS, MAX_CELDAS
+from utils.exportar import disponibles
+from utils.motor import MATERIALES_INI
 
 MAX_CAPAS = 10  # Número máximo de capas por sistema constructivo
 MAX_SC = 5  # Número máximo de sistemas constructivos
 
 PRECARGADOS_DIR = "./data/epw/"
-IMG_DIR = "./data/img/"
+IMG_DIR = "./data/img/"  # Se sirve como estático en /img (ver app.py)
+LOGO = "img/icono-EnerHabitat.png"
 
 meses = {
     "01": "Enero",
@@ -38,12 +41,21 @@ azimuth = {
     "315": "Noroeste",
 }
 
-materiales = eh.config.materials_list()
+def leer_materiales(ruta=MATERIALES_INI):
+    """
+    Nombres de los materiales en el orden del archivo, como eh.config.materials_list(),
+    pero sin importar enerhabitat (que tarda en cargar) al construir la interfaz.
+    El motor apunta eh.config al mismo MATERIALES_INI (utils.motor.cargar_enerhabitat).
+    """
+    config = configparser.ConfigParser()
+    config.read(ruta, encoding="utf-8")
+    return config.sections()
+
+materiales = leer_materiales()
 
-def build_img_uri(img_file_name):
-    img_path = Path(IMG_DIR + f"{img_file_name}")
-    encoded = base64.b64encode(img_path.read_bytes()).decode("utf-8")
-    return f"data:image/png;base64,{encoded}"
+resoluciones = {"rapido": "Rápido", "preciso": "Preciso", "auto": "Automático"}
+
+intervalos = {"1s": "1 s", "1min": "1 min", "1h": "Horario"}
 
 def init_sistemas():
     """
@@ -68,6 +80,10 @@ def init_sistemas():
     return sistemas
 
 def side_card():
+    precargados = [
+        archivo for archivo in os.listdir(PRECARGADOS_DIR)
+        if os.path.isfile(os.path.join(PRECARGADOS_DIR, archivo))
+    ]
     return [
         # ui.input_dark_mode(),
         ui.card(
@@ -78,12 +94,11 @@ def side_card():
                 choices={
                     **{
                         f"precargado_{archivo}": archivo
-                        for i, archivo in enumerate(os.listdir(PRECARGADOS_DIR), 1)
-                        if os.path.isfile(os.path.join(PRECARGADOS_DIR, archivo))
+                        for archivo in precargados
                     },
                     **{"upload": " 🗎 Subir archivo"},
                 },
-                selected=f"precargado_{os.listdir(PRECARGADOS_DIR)[0]}",
+                selected=f"precargado_{precargados[0]}",
             ),
             ui.output_ui("ui_upload"),
             ui.input_select(
@@ -101,7 +116,12 @@ def side_card():
         ui.card(
             ui.card_header("Sistemas constructivos"),
             ui.input_numeric("num_sc", "Número de sistemas:", value=1, min=1, max=MAX_SC, step=1),
-            ui.output_ui("ui_sistemas"),
+            # Se construye una vez; después el servidor inserta o quita
+            # pestañas y capas (ver editor de sistemas en app.py)
+            ui.navset_card_tab(
+                *sc_paneles(1, init_sistemas()),
+                id="sc_seleccionado",
+            ),
             ui.layout_column_wrap(
                 ui.input_action_button(
                     f"remove_capa",
@@ -120,6 +140,15 @@ def side_card():
         ),
         ui.card(
             ui.input_switch("mostrar_Tsa", "Mostrar Tsa", False, width="100%"),
+            ui.input_switch("todos_meses", "Los 12 meses", False, width="100%"),
+            ui.input_radio_buttons(
+                "resolucion",
+                label="Resolución:",
+                choices=resoluciones,
+                selected="preciso",
+                inline=True,
+                width="100%"
+                ),
             ui.input_radio_buttons(
                 "aire_acondicionado",
                 label="",
@@ -134,74 +163,150 @@ def side_card():
                 width="100%",
                 type="success",
             ),
+            ui.input_action_button(
+                "cancelar_sc",
+                "Cancelar",
+                width="100%",
+                class_="btn-outline-danger btn-sm",
+            ),
         ),
     ]
 
 
-def sc_paneles(num_sc, sistemas):
+def barrido_card():
     """
-    Crea una lista de paneles de sistemas constructivos para el navset_card_tab.
+    Controles del barrido paramétrico sobre un sistema constructivo base.
     """
-    paneles = []
-
-    for sc_id in range(1, num_sc + 1):
-        # Obtener las capas activas y sus propiedades
-        capas_activas = sistemas[sc_id]["capas_activas"]
-        capas = sistemas[sc_id]["capas"]
-
-        # Crear elementos del panel del sistema constructivo
-        elementos = [
-            ui.input_numeric(
-                f"absortancia_{sc_id}",
-                "Absortancia:",
-                value=sistemas[sc_id]["absortancia"],
-                min=0,
-                max=1,
-                step=0.01,
+    return [
+        ui.card(
+            ui.card_header("Sistema base"),
+            ui.input_select(
+                "barrido_sc",
+                "Sistema constructivo:",
+                {str(sc_id): f"SC {sc_id}" for sc_id in range(1, MAX_SC + 1)},
+            ),
+            ui.input_numeric("barrido_capa", "Capa a variar:", value=1, min=1, max=MAX_CAPAS, step=1),
+            ui.input_checkbox_group(
+                "barrido_ejes",
+                "Parámetros (uno o dos):",
+                EJES,
+                selected=["ancho", "absortancia"],
+            ),
+        ),
+        ui.card(
+            ui.card_header("Rangos"),
+            ui.input_slider("barrido_ancho", "Ancho (m):", min=0.01, max=0.5, value=(0.05, 0.3), step=0.01),
+            ui.input_numeric("barrido_ancho_pasos", "Pasos de ancho:", value=10, min=1, max=20, step=1),
+            ui.input_slider("barrido_absortancia", "Absortancia:", min=0, max=1, value=(0.2, 0.9), step=0.05),
+            ui.input_numeric("barrido_absortancia_pasos", "Pasos de absortancia:", value=10, min=1, max=20, step=1),
+            ui.input_selectize(
+                "barrido_materiales",
+                "Materiales:",
+                materiales,
+                selected=materiales[:4],
+                multiple=True,
             ),
-            ui.accordion(
-                *capa_paneles(sc_id, capas_activas, capas),
-                id=f"capas_accordion_{sc_id}",
-                open=sistemas[sc_id]["capa_abierta"],
-                multiple=False,
+        ),
+        ui.card(
+            ui.input_select("barrido_metrica", "Métrica:", METRICAS),
+            ui.input_task_button(
+                "barrido_calcular",
+                "Calcular barrido",
+                label_busy="Calculando...",
+                width="100%",
+                type="success",
             ),
-        ]
+            ui.tags.small(f"Máximo {MAX_CELDAS} combinaciones", class_="text-muted"),
+        ),
+    ]
+
+
+def tabla_card():
+    """
+    Controles de la tabla de resultados: intervalo de agregación, orden,
+    filtro, página y formato de descarga. El servidor manda sólo la página
+    visible.
+    """
+    return [
+        ui.card(
+            ui.card_header("Tabla"),
+            ui.input_radio_buttons("tabla_intervalo", "Intervalo:", intervalos, selected="1min", inline=True),
+            ui.input_select("tabla_orden", "Ordenar por:", {"Time": "Hora"}),
+            ui.input_switch("tabla_descendente", "Descendente"),
+        ),
+        ui.card(
+            ui.card_header("Filtro"),
+            ui.input_select("tabla_filtro", "Columna:", {"": "Sin filtro"}),
+            ui.input_numeric("tabla_minimo", "Mínimo:", value=None),
+            ui.input_numeric("tabla_maximo", "Máximo:", value=None),
+        ),
+        ui.card(
+            ui.input_numeric("tabla_pagina", "Página:", value=1, min=1, step=1),
+            ui.output_text("tabla_resumen"),
+        ),
+        ui.card(
+            ui.card_header("Descarga"),
+            ui.input_select("formato_descarga", "Formato:", disponibles()),
+        ),
+    ]
+
+
+def sc_paneles(num_sc, sistemas):
+    """
+    Crea una lista de paneles de sistemas constructivos para el navset_card_tab.
+    """
+    return [sc_panel(sc_id, sistemas[sc_id]) for sc_id in range(1, num_sc + 1)]
 
-        panel = ui.nav_panel(f"SC {sc_id}", elementos)
-        paneles.append(panel)
 
-    return paneles
+def sc_panel(sc_id, sistema):
+    """
+    Panel de un sistema constructivo: absortancia y acordeón de sus capas activas.
+    """
+    return ui.nav_panel(
+        f"SC {sc_id}",
+        ui.input_numeric(
+            f"absortancia_{sc_id}",
+            "Absortancia:",
+            value=sistema["absortancia"],
+            min=0,
+            max=1,
+            step=0.01,
+        ),
+        ui.accordion(
+            *capa_paneles(sc_id, sistema["capas_activas"], sistema["capas"]),
+            id=f"capas_accordion_{sc_id}",
+            open=sistema["capa_abierta"],
+            multiple=False,
+        ),
+    )
 
 
 def capa_paneles(sc_id, capas_activas, capas):
     """
     Crea una lista para los elementos del acordeon de las capas activas de un sistema constructivo.
     """
-    panels = []
-    for capa_id in range(1, capas_activas+1):
-        # Asegurarse de que la capa existe en el diccionario de capas
-        if capa_id not in capas:
-            continue
-        
-        material = capas[capa_id]["material"]
-        ancho = capas[capa_id]["ancho"]
-        
-        # Crear el panel para la capa
-        panels.append(
-            ui.accordion_panel(
-                f"{capa_id} - {material} {ancho} m",
-                ui.input_select(
-                    f"material_capa_{sc_id}_{capa_id}", "Material:", materiales, selected=material
-                ),
-                ui.input_numeric(
-                    f"ancho_capa_{sc_id}_{capa_id}",
-                    "Ancho (m):",
-                    value=ancho,
-                    step=0.01,
-                    min=0.01,
-                ),
-                value=f"capa_{capa_id}"
-            )
-        )
+    return [capa_panel(sc_id, capa_id, capas[capa_id]) for capa_id in range(1, capas_activas + 1) if capa_id in capas]
+
+
+def titulo_capa(capa_id, capa):
+    return f"{capa_id} - {capa['material']} {capa['ancho']} m"
+
 
-    return panels
+def capa_panel(sc_id, capa_id, capa):
+    """
+    Panel del acordeón para una capa: material y ancho.
+    """
+    return ui.accordion_panel(
+        titulo_capa(capa_id, capa),
+        ui.input_select(
+            f"material_capa_{sc_id}_{capa_id}", "Material:", materiales, selected=capa["material"]
+        ),
+        ui.input_numeric(
+            f"ancho_capa_{sc_id}_{capa_id}",
+            "Ancho (m):",
+            value=capa["ancho"],
+            step=0.01,
+            min=0.01,
+        ),
+        value=f"capa_{capa_id}",
+    )
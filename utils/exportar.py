@@ -0,0 +1,165 @@
+# utils/exportar.py
+# -*- coding: utf-8 -*-
+"""
+Descargas de series en streaming.
+La tabla se recorre en bloques de FILAS_BLOQUE filas y cada bloque se manda
+en cuanto está listo, así la descarga empieza de inmediato y la memoria del
+servidor no crece con el número de sistemas. Formatos:
+    csv        CSV con BOM (para Excel), redondeado
+    csv.gz     el mismo CSV comprimido con gzip al vuelo
+    parquet    Parquet por grupos de filas, sin redondear  (necesita pyarrow)
+    feather    Arrow IPC (Feather v2) por lotes            (necesita pyarrow)
+Parquet y Feather guardan en el esquema los metadatos de la corrida (EPW,
+mes, orientación, capas y Nx de cada sistema) bajo la clave "enerhabitat".
+Uso:
+    for bloque in descargar(tabla, "csv.gz"):
+        salida.write(bloque)
+"""
+
+from __future__ import annotations
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import zlib
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+
+FILAS_BLOQUE = 10_000  # Filas por bloque de la descarga
+FORMATOS = {"csv": "CSV", "csv.gz": "CSV (gzip)", "parquet": "Parquet", "feather": "Feather"}
+COLUMNARES = ("parquet", "feather")
+MEDIA = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+}
+
+# pyarrow es opcional: sin él sólo se ofrecen los formatos CSV
+PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def disponibles() -> dict:
+    """Formatos que se pueden generar con los paquetes instalados."""
+    return {f: nombre for f, nombre in FORMATOS.items() if PYARROW or f not in COLUMNARES}
+
+
+def metadatos(trabajos: list[dict], resultados=()) -> dict:
+    """Parámetros de una corrida: los comunes y, por sistema, absortancia, capas y Nx."""
+    nx = {r["sc_id"]: r.get("Nx") for r in resultados}
+    primero = trabajos[0] if trabajos else {}
+    return {
+        "enerhabitat": version("enerhabitat"),
+        "epw": os.path.basename(str(primero.get("epw", ""))),
+        "mes": primero.get("mes"),
+        "tilt": primero.get("tilt"),
+        "azimuth": primero.get("azimuth"),
+        "aire": primero.get("aire"),
+        "sistemas": [
+            {
+                "sc": t["sc_id"],
+                "absortancia": t["absortancia"],
+                "capas": [[material, ancho] for material, ancho in t["capas"]],
+                "Nx": nx.get(t["sc_id"], t.get("Nx")),
+            }
+            for t in trabajos
+        ],
+    }
+
+
+def _bloques(tabla: pd.DataFrame, decimales: int | None, filas: int):
+    """Bloques de la tabla con la hora como primera columna."""
+    for inicio in range(0, len(tabla), filas):
+        bloque = tabla.iloc[inicio:inicio + filas]
+        if decimales is not None:
+            bloque = bloque.astype(np.float64).round(decimales)
+        bloque = bloque.reset_index(drop=True)
+        bloque.insert(0, "Time", tabla.index[inicio:inicio + filas])
+        yield bloque
+
+
+def csv(tabla: pd.DataFrame, decimales: int = 1, comprimir: bool = False, filas: int = FILAS_BLOQUE):
+    """CSV por bloques; con `comprimir` sale como un solo miembro gzip."""
+    compresor = zlib.compressobj(wbits=31) if comprimir else None  # wbits=31: encabezado gzip
+    for i, bloque in enumerate(_bloques(tabla, decimales, filas)):
+        datos = bloque.to_csv(index=False, header=i == 0).encode("utf-8-sig" if i == 0 else "utf-8")
+        if compresor is not None:
+            datos = compresor.compress(datos)
+        if datos:
+            yield datos
+    if compresor is not None:
+        yield compresor.flush()
+
+
+class _Sumidero(io.RawIOBase):
+    """Archivo de sólo escritura que se vacía después de cada bloque."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def columnar(tabla: pd.DataFrame, formato: str, meta: dict | None = None, filas: int = FILAS_BLOQUE):
+    """Parquet (un grupo de filas por bloque) o Feather (un lote por bloque) con metadatos."""
+    from utils.lote import requiere_pyarrow
+
+    requiere_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sumidero = _Sumidero()
+    escritor = None
+    esquema = None
+    for bloque in _bloques(tabla, None, filas):
+        if escritor is None:
+            esquema = pa.Schema.from_pandas(bloque, preserve_index=False)
+            esquema = esquema.with_metadata({
+                **(esquema.metadata or {}),
+                b"enerhabitat": json.dumps(meta or {}, ensure_ascii=False).encode(),
+            })
+            if formato == "parquet":
+                escritor = pq.ParquetWriter(sumidero, esquema)
+            else:
+                escritor = pa.ipc.new_file(sumidero, esquema)
+        lote = pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False)
+        escritor.write_table(lote)
+        yield sumidero.vaciar()
+    if escritor is not None:
+        escritor.close()
+        yield sumidero.vaciar()
+
+
+def descargar(tabla: pd.DataFrame, formato: str = "csv", meta: dict | None = None, decimales: int = 1):
+    """Bloques de bytes de la tabla en el formato pedido."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato}")
+    if formato in COLUMNARES:
+        return columnar(tabla, formato, meta)
+    return csv(tabla, decimales, comprimir=formato == "csv.gz")
+
+
+async def en_hilo(bloques):
+    """Recorre un iterador de bloques en un hilo para no detener el event loop."""
+    iterador = iter(bloques)
+    fin = object()
+    while (bloque := await asyncio.to_thread(next, iterador, fin)) is not fin:
+        yield bloque
@@ -2,16 +2,23 @@
 # -*- coding: utf-8 -*-
 """
 Funciones para obtener el hash y la rama del commit actual.
-Prioriza variables de entorno (CI/CD), luego `git`, y finalmente lectura de .git.
+Prioriza variables de entorno (CI/CD), luego el archivo generado BUILD_FILE,
+luego `git`, y finalmente lectura de .git.
+El archivo se genera al construir la imagen para que el arranque no lance
+procesos de git (ni dependa de que .git exista):
+    python -m utils.extraer
 Uso:
     from utils.extraer_commit import get_git_info
     commit_hash, branch = get_git_info(short=True)
 """
 
 from __future__ import annotations
+import json
 import os
 import subprocess
 
+BUILD_FILE = os.environ.get("EH_BUILD_FILE", "./data/build.json")
+
 
 def _from_env():
     # Hash
@@ -34,6 +41,15 @@ def _from_env():
     return commit, branch
 
 
+def _from_file():
+    try:
+        with open(BUILD_FILE, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    return datos.get("commit"), datos.get("branch")
+
+
 def _run_git(cmd: list[str]) -> str | None:
     try:
         out = subprocess.check_output(cmd, stderr=subprocess.DEVNULL).decode().strip()
@@ -96,19 +112,25 @@ def _from_git_dir():
         return commit, branch
 
 
-def get_git_info(short: bool = True):
+def get_git_info(short: bool = True, archivo: bool = True):
     """
     Devuelve (commit_hash, branch). Si no se puede determinar, retorna "unknown".
     short=True => hash de 7 caracteres.
+    archivo=False => no leer BUILD_FILE (para regenerarlo).
     """
     # 1) Entorno
     c, b = _from_env()
-    # 2) CLI git
+    # 2) Archivo generado
+    if archivo and (not c or not b):
+        c1, b1 = _from_file()
+        c = c or c1
+        b = b or b1
+    # 3) CLI git
     if not c:
         c2, b2 = _from_git_cli()
         c = c or c2
         b = b or b2
-    # 3) Archivos .git
+    # 4) Archivos .git
     if not c or not b:
         c3, b3 = _from_git_dir()
         c = c or c3
@@ -123,3 +145,19 @@ def get_git_info(short: bool = True):
         c = c[:7]
 
     return c, b
+
+
+def escribir_build(ruta: str = BUILD_FILE) -> dict:
+    """Guarda el commit completo y la rama actuales en `ruta` (ignorando un archivo previo)."""
+    c, b = get_git_info(short=False, archivo=False)
+    datos = {"commit": c, "branch": b}
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+    return datos
+
+
+if __name__ == "__main__":
+    print(json.dumps(escribir_build()))
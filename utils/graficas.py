@@ -0,0 +1,181 @@
+# utils/graficas.py
+# -*- coding: utf-8 -*-
+"""
+Series de tiempo con varias resoluciones para las gráficas.
+Cada columna se guarda como una pirámide de niveles (cada 1, 60, 300 y 900
+filas) reducidos con mín/máx por bloque, que conserva los picos. La gráfica
+inicial usa el nivel más fino que cabe en PUNTOS_MAX puntos en total y, al
+hacer zoom, se vuelve a pedir al servidor la ventana visible con más detalle.
+Las trazas son Scattergl (WebGL) dentro de un FigureWidget persistente
+(GraficaSeries) que se modifica en el lugar.
+Uso:
+    grafica = GraficaSeries()          # una vez por sesión; grafica.fig va al output
+    grafica.series(Piramide(df, ["Ta"]), ["Ta"], "°C", "Temperatura")
+    grafica.mostrar(lambda nombre: nombre != "Ta")
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from utils.trazas import medir
+
+PUNTOS_MAX = 4000  # Puntos por gráfica, repartidos entre las trazas
+NIVELES = (1, 60, 300, 900)  # Filas por bloque de cada nivel (1 = datos originales)
+
+
+def minmax(x: np.ndarray, y: np.ndarray, paso: int) -> tuple[np.ndarray, np.ndarray]:
+    """Reduce a dos puntos (mínimo y máximo, en orden temporal) por bloque de `paso` filas."""
+    if paso <= 1 or len(y) <= 2 * paso:
+        return x, y
+    n = len(y) // paso * paso
+    bloques = y[:n].reshape(-1, paso)
+    base = np.arange(0, n, paso)
+    indices = [base + bloques.argmin(axis=1), base + bloques.argmax(axis=1)]
+    if n < len(y):  # Bloque final incompleto
+        indices.append([n + y[n:].argmin(), n + y[n:].argmax()])
+    indices = np.unique(np.concatenate(indices))
+    return x[indices], y[indices]
+
+
+class Piramide:
+    """Niveles mín/máx de cada columna de un DataFrame indexado por tiempo."""
+
+    def __init__(self, df: pd.DataFrame, columnas):
+        indice = df.index
+        if getattr(indice, "tz", None) is not None:
+            indice = indice.tz_localize(None)  # Hora local, como la muestra Plotly
+        x = indice.to_numpy()
+        self.niveles = {
+            col: [minmax(x, df[col].to_numpy(dtype=np.float64), paso) for paso in NIVELES]
+            for col in columnas
+        }
+
+    def ventana(self, columna: str, inicio=None, fin=None, puntos: int = PUNTOS_MAX):
+        """(x, y) de la columna entre inicio y fin con el nivel más fino que cabe en `puntos`."""
+        for x, y in self.niveles[columna]:
+            i, j = 0, len(x)
+            if inicio is not None:
+                i = int(np.searchsorted(x, np.datetime64(_sin_zona(inicio)), side="left"))
+            if fin is not None:
+                j = int(np.searchsorted(x, np.datetime64(_sin_zona(fin)), side="right"))
+            if j - i <= puntos:
+                break
+        # Un punto extra a cada lado para que la línea no se corte en el borde
+        i, j = max(i - 1, 0), min(j + 1, len(x))
+        return x[i:j], y[i:j]
+
+
+def _sin_zona(valor):
+    """Plotly manda las fechas sin zona horaria: se comparan como hora local."""
+    fecha = pd.Timestamp(valor)
+    return fecha.tz_localize(None) if fecha.tzinfo else fecha
+
+
+class GraficaSeries:
+    """
+    FigureWidget persistente de una sesión. Los cambios de datos reemplazan
+    trazas y forma en el mismo widget y los cambios de vista (mostrar u
+    ocultar trazas) sólo mandan la propiedad que cambió. El zoom pide al
+    servidor la ventana visible con más detalle.
+    """
+
+    def __init__(self):
+        # plotly se importa con la primera gráfica, no al importar la app
+        import plotly.graph_objects as go
+
+        self.fig = go.FigureWidget()
+        self.piramide = None
+        self._dibujados = None  # Objetos de datos ya dibujados
+        self.fig.layout.xaxis.on_change(self._al_cambiar, "range")
+
+    def ya_dibujado(self, *datos) -> bool:
+        """True si estos mismos objetos (por identidad) ya están dibujados; si no, los registra."""
+        if self._dibujados is not None and len(datos) == len(self._dibujados) \
+                and all(a is b for a, b in zip(datos, self._dibujados)):
+            return True
+        self._dibujados = datos
+        return False
+
+    @medir("grafica")
+    def series(self, piramide: Piramide, columnas, etiqueta_y: str, leyenda: str,
+               visible=lambda columna: True, etiqueta_x: str = "Hora"):
+        """Una traza Scattergl por columna, reducida a PUNTOS_MAX puntos en total."""
+        import plotly.graph_objects as go
+
+        self.piramide = piramide
+        puntos = PUNTOS_MAX // max(len(columnas), 1)
+        trazas = []
+        for columna in columnas:
+            x, y = piramide.ventana(columna, puntos=puntos)
+            trazas.append(go.Scattergl(x=x, y=y, name=columna, mode="markers", visible=visible(columna)))
+        self._reemplazar(trazas, etiqueta_x, etiqueta_y, leyenda, tipo_x="date")
+
+    @medir("grafica")
+    def barras(self, x, columnas: dict, etiqueta_x: str, etiqueta_y: str, leyenda: str, hover: dict | None = None):
+        """Barras apiladas: columnas = {nombre: valores}; hover = {nombre: valores} extra."""
+        import plotly.graph_objects as go
+
+        self.piramide = None
+        extra = ""
+        customdata = None
+        if hover:
+            customdata = np.column_stack(list(hover.values()))
+            extra = "".join(f"<br>{nombre}=%{{customdata[{i}]}}" for i, nombre in enumerate(hover))
+        trazas = [
+            go.Bar(
+                x=x,
+                y=y,
+                name=nombre,
+                texttemplate="%{y}",
+                customdata=customdata,
+                hovertemplate=f"{etiqueta_x}=%{{x}}<br>{etiqueta_y}=%{{y}}{extra}<extra>{nombre}</extra>",
+            )
+            for nombre, y in columnas.items()
+        ]
+        self._reemplazar(trazas, etiqueta_x, etiqueta_y, leyenda, tipo_x="category", barmode="stack")
+
+    def franja(self, y0: float, y1: float):
+        """Franja horizontal (p. ej. la zona de confort)."""
+        self.fig.add_hrect(y0=y0, y1=y1, fillcolor="lime", opacity=0.3, line_width=0)
+
+    def mostrar(self, visible):
+        """Cambia sólo la visibilidad de las trazas que lo necesitan."""
+        with self.fig.batch_update():
+            for traza in self.fig.data:
+                valor = bool(visible(traza.name))
+                if traza.visible != valor:
+                    traza.visible = valor
+
+    def limpiar(self):
+        self.piramide = None
+        with self.fig.batch_update():
+            self.fig.data = ()
+            self.fig.layout.shapes = ()
+
+    def _reemplazar(self, trazas, etiqueta_x, etiqueta_y, leyenda, tipo_x, barmode=None):
+        with self.fig.batch_update():
+            self.fig.data = ()
+            self.fig.layout.shapes = ()
+            self.fig.add_traces(trazas)
+            self.fig.update_layout(
+                barmode=barmode,
+                xaxis_type=tipo_x,
+                xaxis_autorange=True,
+                xaxis_title=etiqueta_x,
+                yaxis_title=etiqueta_y,
+                legend_title_text=leyenda,
+            )
+
+    @medir("grafica.zoom")
+    def _al_cambiar(self, eje, rango):
+        """Al cambiar el rango del eje x, reemplaza cada traza por la ventana visible."""
+        if self.piramide is None:
+            return
+        inicio, fin = rango if rango else (None, None)
+        puntos = PUNTOS_MAX // max(len(self.fig.data), 1)
+        with self.fig.batch_update():
+            for traza in self.fig.data:
+                if traza.name in self.piramide.niveles:
+                    traza.x, traza.y = self.piramide.ventana(traza.name, inicio, fin, puntos)
@@ -0,0 +1,184 @@
+# utils/ingesta.py
+# -*- coding: utf-8 -*-
+"""
+Ingesta de archivos EPW subidos por los usuarios.
+Cada archivo se identifica por el hash de su contenido y se guarda una sola
+vez en EPW_DIR como <hash>.epw; si otro usuario sube el mismo archivo (o lo
+sube mientras el primero aún se procesa) se reutiliza sin volver a leerlo.
+La validación y el meanDay del mes seleccionado se calculan en un proceso
+propio, con límites de tamaño y de tiempo: si se pasa de TIEMPO_MAX el
+proceso se termina, así que un archivo malicioso no deja ocupado a nadie. Los otros 11 meses se compilan en segundo plano hacia el
+almacén, así que cambiar de mes después ya no recalcula nada.
+Los EPW subidos ocupan a lo más MAX_SUBIDOS_MB: al guardar uno nuevo se borran
+los usados hace más tiempo, salvo los de la última hora (una sesión puede
+seguir usándolos). El almacén tiene su propio límite (utils.almacen).
+Uso:
+    ruta = await ingerir_epw(datapath, mes)   # ruta compartida del EPW
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from datetime import date
+
+from utils.cache import hash_epw
+from utils.card import meses
+from utils.motor import precargar_dias_async
+
+EPW_DIR = "./data/cache/epw/"
+MAX_EPW_MB = 20  # Tamaño máximo de un EPW subido
+MAX_SUBIDOS_MB = float(os.environ.get("EH_SUBIDOS_MB", 500))  # Todos los EPW subidos
+USO_RECIENTE = 3600  # Segundos durante los que un EPW subido no se borra
+TIEMPO_MAX = 60  # Segundos para validar el archivo y calcular su primer mes
+LINEAS_ENCABEZADO = 8
+HORAS_VALIDAS = (8760, 8784)  # Año normal o bisiesto
+
+logger = logging.getLogger(__name__)
+
+# Ingestas en curso por hash y tareas de precarga que no deben recolectarse
+_en_curso: dict[str, asyncio.Future] = {}
+_segundo_plano: set[asyncio.Task] = set()
+
+
+def validar_epw(ruta: str, epw_hash: str, mes: str) -> str:
+    """
+    Revisa la estructura del EPW y guarda en el almacén el meanDay del mes.
+    Regresa la ciudad. Corre en un proceso aparte (`_en_proceso`); no pasa por las
+    cachés en memoria porque `ruta` es un temporal que se renombra después.
+    """
+    with open(ruta, "r", encoding="utf-8", errors="replace") as f:
+        encabezado = [f.readline() for _ in range(LINEAS_ENCABEZADO)]
+        horas = sum(1 for linea in f if linea.strip())
+    if not encabezado[0].startswith("LOCATION,"):
+        raise ValueError("El archivo no parece un EPW: falta el encabezado LOCATION.")
+    if horas not in HORAS_VALIDAS:
+        raise ValueError(f"El EPW debe tener 8760 registros horarios y tiene {horas}.")
+
+    import enerhabitat as eh
+    from utils import almacen
+
+    year = date.today().year
+    location = eh.Location(epw_file=ruta)
+    almacen.guardar_dia_promedio(epw_hash, location, mes, year, location.meanDay(month=mes, year=year))
+    return location.city
+
+
+def _correr(conexion, funcion, args):
+    """Cuerpo del proceso: manda (True, resultado) o (False, excepción)."""
+    try:
+        conexion.send((True, funcion(*args)))
+    except Exception as error:
+        conexion.send((False, error))
+    finally:
+        conexion.close()
+
+
+async def _en_proceso(funcion, *args, tiempo: float):
+    """
+    Corre `funcion(*args)` en un proceso nuevo y lo termina si no responde en
+    `tiempo` segundos (el pool del motor no permite matar un trabajo a medias).
+    """
+    contexto = multiprocessing.get_context("spawn")
+    receptor, emisor = contexto.Pipe(duplex=False)
+    proceso = contexto.Process(target=_correr, args=(emisor, funcion, args), daemon=True)
+    proceso.start()
+    emisor.close()
+    try:
+        if not await asyncio.to_thread(receptor.poll, tiempo):
+            raise ValueError(f"El EPW tardó más de {tiempo} s en procesarse.")
+        try:
+            correcto, valor = receptor.recv()
+        except EOFError:
+            raise ValueError("El proceso que validaba el EPW terminó sin responder.") from None
+    finally:
+        if proceso.is_alive():
+            proceso.terminate()
+        await asyncio.to_thread(proceso.join)
+        receptor.close()
+    if not correcto:
+        raise valor
+    return valor
+
+
+async def _ingerir(datapath: str, epw_hash: str, destino: str, mes: str) -> str:
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    try:
+        # Copia propia: el archivo temporal de Shiny se borra al cerrar la sesión
+        await asyncio.to_thread(os.makedirs, EPW_DIR, exist_ok=True)
+        await asyncio.to_thread(shutil.copyfile, datapath, temporal)
+        ciudad = await _en_proceso(validar_epw, temporal, epw_hash, mes, tiempo=TIEMPO_MAX)
+        os.replace(temporal, destino)
+        await asyncio.to_thread(_recortar_subidos, MAX_SUBIDOS_MB * 1024 * 1024)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    logger.info("EPW subido: %s (%s)", ciudad, os.path.basename(destino))
+    return destino
+
+
+def _recortar_subidos(max_bytes: float):
+    """Borra los EPW subidos menos recientes hasta quedar en 90 % de `max_bytes`."""
+    try:
+        archivos = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(EPW_DIR)
+                    if e.name.endswith(".epw")]
+    except OSError:
+        return
+    total = sum(tam for _, tam, _ in archivos)
+    if total <= max_bytes:
+        return
+    limite = time.time() - USO_RECIENTE
+    for uso, tam, ruta in sorted(archivos):
+        if total <= max_bytes * 0.9 or uso > limite:
+            break
+        try:
+            os.remove(ruta)
+            total -= tam
+        except OSError:
+            pass
+
+
+def _precargar(ruta: str):
+    """Compila en segundo plano los meanDay de los 12 meses."""
+    tarea = asyncio.ensure_future(precargar_dias_async([{"epw": ruta, "mes": mes} for mes in meses]))
+    _segundo_plano.add(tarea)
+
+    def _terminar(t):
+        _segundo_plano.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning("No se pudieron precargar los meses de %s: %s", ruta, t.exception())
+
+    tarea.add_done_callback(_terminar)
+
+
+async def ingerir_epw(datapath: str, mes: str) -> str:
+    """
+    Valida y guarda un EPW subido y regresa su ruta compartida. Lanza
+    ValueError si el archivo es demasiado grande, no es un EPW válido o
+    tarda demasiado en procesarse.
+    """
+    if os.path.getsize(datapath) > MAX_EPW_MB * 1024 * 1024:
+        raise ValueError(f"El EPW supera el máximo de {MAX_EPW_MB} MB.")
+
+    epw_hash = await asyncio.to_thread(hash_epw, datapath)
+    destino = os.path.join(EPW_DIR, f"{epw_hash}.epw")
+    if os.path.isfile(destino):
+        os.utime(destino)  # Último uso, para _recortar_subidos
+        return destino
+
+    tarea = _en_curso.get(epw_hash)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_ingerir(datapath, epw_hash, destino, mes))
+        _en_curso[epw_hash] = tarea
+
+        def _terminar(t):
+            _en_curso.pop(epw_hash, None)
+            if not t.cancelled() and t.exception() is None:
+                _precargar(t.result())
+
+        tarea.add_done_callback(_terminar)
+    # shield: si una sesión cancela, la ingesta compartida sigue para las demás
+    return await asyncio.shield(tarea)
@@ -0,0 +1,241 @@
+# utils/lote.py
+# -*- coding: utf-8 -*-
+"""
+Simulaciones por lote sin la interfaz de Shiny.
+Un archivo de trabajos (JSON o CSV) describe sistemas constructivos, EPW,
+meses y orientaciones; cada combinación se resuelve con el motor
+(utils.motor), así que el lote comparte el pool de procesos y las cachés
+con la aplicación web. Los resultados salen como NDJSON, una línea por
+sistema en cuanto termina, o como Parquet si está instalado pyarrow.
+
+JSON: {"base": {...}, "trabajos": [{...}, ...]} o directamente la lista.
+    {"epw": "ruta.epw", "mes": "01", "tilt": 90, "azimuth": 180,
+     "absortancia": 0.8, "capas": [["Adobe", 0.2]], "aire": false, "Nx": 200}
+    Nx acepta un entero o un modo: "rapido", "preciso" o "auto".
+    epw, mes, tilt, azimuth y absortancia aceptan listas (se combinan todas)
+    y "mes": "todos" equivale a los 12 meses.
+CSV: mismas columnas, con capas como "Adobe:0.2|Ladrillo:0.1".
+Uso:
+    python -m utils.lote trabajos.json > resultados.ndjson
+    python -m utils.lote trabajos.csv -o resultados.parquet --formato parquet
+"""
+
+from __future__ import annotations
+import argparse
+import io
+import json
+import math
+import os
+import sys
+from itertools import product
+
+import pandas as pd
+
+from utils.card import PRECARGADOS_DIR, meses
+from utils.motor import NX, RESOLUCIONES, cargar_enerhabitat, resolver_sistemas
+
+FORMATOS = ("ndjson", "parquet")
+COMBINABLES = ("epw", "mes", "tilt", "azimuth", "absortancia")
+METRICAS = ("FD", "FDsa", "TR", "ET", "Eenf", "Ecal", "Etotal", "Timax", "Hconf", "GHsup", "GHinf")
+MAX_TRABAJOS = 100_000  # Límite de combinaciones por archivo
+
+
+def _capas(valor) -> list[tuple[str, float]]:
+    """Acepta [[material, ancho], ...] o "material:ancho|material:ancho"."""
+    eh = cargar_enerhabitat()
+
+    if isinstance(valor, str):
+        valor = [capa.rsplit(":", 1) for capa in valor.split("|") if capa.strip()]
+    capas = []
+    for material, ancho in valor:
+        material = str(material).strip()
+        if material not in eh.config.materials_list():
+            raise ValueError(f"Material desconocido: {material}")
+        capas.append((material, float(ancho)))
+    if not capas:
+        raise ValueError("Cada trabajo necesita al menos una capa.")
+    return capas
+
+
+def _aire(valor) -> bool:
+    if isinstance(valor, str):
+        return valor.strip().lower() in ("1", "true", "si", "sí", "con ac")
+    return bool(valor)
+
+
+def _resolucion(valor):
+    if valor in (None, ""):
+        return NX
+    if str(valor) in RESOLUCIONES:
+        return RESOLUCIONES[str(valor)]
+    return int(valor)
+
+
+def _expandir(entrada: dict):
+    """
+    Producto de los campos combinables que vienen como lista.
+    Es un generador para que `normalizar` corte en el máximo sin armar el producto completo.
+    """
+    opciones = {}
+    for campo in COMBINABLES:
+        if campo not in entrada:
+            continue
+        valor = entrada[campo]
+        if campo == "mes" and valor == "todos":
+            valor = list(meses)
+        opciones[campo] = valor if isinstance(valor, list) else [valor]
+    for valores in product(*opciones.values()):
+        yield dict(entrada, **dict(zip(opciones, valores)))
+
+
+def ruta_epw(nombre: str) -> str:
+    """Ruta del EPW tal cual o, si no existe, entre los precargados."""
+    if os.path.isfile(nombre):
+        return nombre
+    return os.path.join(PRECARGADOS_DIR, nombre)
+
+
+def normalizar(entradas: list[dict], resolver_epw=ruta_epw, maximo: int = MAX_TRABAJOS) -> list[dict]:
+    """
+    Valida las entradas y las convierte en trabajos del motor con sc_id
+    consecutivo. `resolver_epw(nombre)` traduce el campo epw a una ruta y
+    `maximo` acota el número de trabajos tras combinar las listas.
+    """
+    trabajos = []
+    for entrada in entradas:
+        for e in _expandir(entrada):
+            faltan = [c for c in ("epw", "capas") if not e.get(c)]
+            if faltan:
+                raise ValueError(f"Faltan campos en el trabajo {len(trabajos) + 1}: {', '.join(faltan)}")
+            mes = f"{int(e.get('mes') or 1):02}"
+            if mes not in meses:
+                raise ValueError(f"Mes inválido: {e.get('mes')}")
+            epw = resolver_epw(str(e["epw"]))
+            if not os.path.isfile(epw):
+                raise ValueError(f"No existe el EPW: {e['epw']}")
+            absortancia = float(e.get("absortancia", 0.8))
+            if not 0 <= absortancia <= 1:
+                raise ValueError(f"Absortancia fuera de rango: {absortancia}")
+
+            trabajos.append({
+                "sc_id": len(trabajos) + 1,
+                "epw": epw,
+                "mes": mes,
+                "tilt": float(e.get("tilt", 90)),
+                "azimuth": float(e.get("azimuth", 0)),
+                "absortancia": absortancia,
+                "capas": _capas(e["capas"]),
+                "aire": _aire(e.get("aire", False)),
+                "Nx": _resolucion(e.get("Nx")),
+            })
+            if len(trabajos) > maximo:
+                raise ValueError(f"El lote supera el máximo de {maximo} trabajos.")
+    return trabajos
+
+
+def leer_entradas(datos: str | bytes, formato: str) -> list[dict]:
+    """Entradas de un archivo de trabajos ya leído ("json" o "csv")."""
+    if formato == "csv":
+        tabla = pd.read_csv(io.StringIO(datos.decode() if isinstance(datos, bytes) else datos), dtype=str)
+        return [{k: v for k, v in fila.items() if isinstance(v, str)} for fila in tabla.to_dict("records")]
+
+    contenido = json.loads(datos)
+    if isinstance(contenido, list):
+        return contenido
+    base = contenido.get("base", {})
+    return [dict(base, **entrada) for entrada in contenido.get("trabajos", [])]
+
+
+def leer_trabajos(ruta: str) -> list[dict]:
+    """Trabajos del motor desde un archivo .json o .csv."""
+    formato = "csv" if ruta.lower().endswith(".csv") else "json"
+    with open(ruta, "rb") as f:
+        return normalizar(leer_entradas(f.read(), formato))
+
+
+def fila_resultado(trabajo: dict, resultado: dict, series: bool = False) -> dict:
+    """Una fila plana por sistema: parámetros del trabajo y métricas."""
+    fila = {
+        "id": trabajo["sc_id"],
+        "epw": os.path.basename(trabajo["epw"]),
+        "mes": trabajo["mes"],
+        "tilt": trabajo["tilt"],
+        "azimuth": trabajo["azimuth"],
+        "absortancia": trabajo["absortancia"],
+        "capas": "|".join(f"{m}:{a}" for m, a in trabajo["capas"]),
+        "aire": trabajo["aire"],
+        "Nx": resultado["Nx"],
+        "tiempo": round(resultado["tiempo"], 4),
+    }
+    for clave in METRICAS:
+        valor = resultado["metricas"][clave]
+        fila[clave] = None if isinstance(valor, float) and math.isnan(valor) else valor
+    if series:
+        solucion = resultado["solucion"]
+        fila["hora"] = [t.strftime("%H:%M") for t in solucion.index]
+        fila["Tsa"] = solucion["Tsa"].round(4).tolist()
+        fila["Ti"] = solucion["Ti"].round(4).tolist()
+    return fila
+
+
+def linea_ndjson(fila: dict) -> str:
+    return json.dumps(fila, ensure_ascii=False) + "\n"
+
+
+def requiere_pyarrow():
+    """pyarrow es opcional: sólo hace falta para la salida Parquet."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("La salida Parquet necesita pyarrow (pip install pyarrow).") from None
+
+
+def parquet_bytes(filas: list[dict]) -> bytes:
+    """Tabla Parquet de las filas ordenadas por id. Necesita pyarrow."""
+    requiere_pyarrow()
+    buffer = io.BytesIO()
+    pd.DataFrame(sorted(filas, key=lambda f: f["id"])).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.lote", description="Simulaciones por lote de EnerHabitat")
+    parser.add_argument("trabajos", help="archivo de trabajos .json o .csv")
+    parser.add_argument("-o", "--salida", help="archivo de salida (NDJSON por defecto a stdout)")
+    parser.add_argument("--formato", choices=FORMATOS, default="ndjson")
+    parser.add_argument("--series", action="store_true", help="incluir Tsa y Ti de cada sistema")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.formato == "parquet":
+            requiere_pyarrow()
+        trabajos = leer_trabajos(args.trabajos)
+    except (OSError, ValueError, RuntimeError) as error:
+        parser.error(str(error))
+    por_id = {t["sc_id"]: t for t in trabajos}
+    print(f"{len(trabajos)} trabajos", file=sys.stderr)
+
+    if args.formato == "parquet":
+        if not args.salida:
+            parser.error("La salida Parquet necesita -o/--salida.")
+        resultados = resolver_sistemas(trabajos)
+        filas = [fila_resultado(por_id[r["sc_id"]], r, args.series) for r in resultados]
+        with open(args.salida, "wb") as f:
+            f.write(parquet_bytes(filas))
+        return
+
+    # NDJSON: cada sistema se escribe en cuanto termina
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else sys.stdout
+    try:
+        def avance(resultado):
+            salida.write(linea_ndjson(fila_resultado(por_id[resultado["sc_id"]], resultado, args.series)))
+            salida.flush()
+
+        resolver_sistemas(trabajos, avance=avance)
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# utils/memoria.py
+# -*- coding: utf-8 -*-
+"""
+Presupuesto de memoria de las sesiones.
+Lo que crece en memoria no son las series de un Resultado (144 filas por
+sistema con dt = 600 s) sino las vistas memorizadas: la tabla redondeada,
+las agregadas, los órdenes y las pirámides; sobre todo las del meanDay
+(86,400 filas), que se comparten entre sesiones (`vistas_compartidas`).
+El presupuesto mide tablas y vistas de los Resultado de cada sesión y de las
+vistas compartidas, y suelta las vistas memorizadas (utils.resultado):
+    - de lo que lleva más de INACTIVO_MIN minutos sin usarse,
+    - de una sesión que supera MEMORIA_SESION_MB, del menos reciente
+      al más reciente,
+    - de todo el proceso, del menos reciente, si se supera MEMORIA_TOTAL_MB
+      (aquí también cuentan las vistas compartidas).
+Soltar no reemplaza la tabla: quien esté leyendo una vista la conserva y la
+siguiente petición la recalcula. El meanDay mismo no entra: viene del
+almacén con memoria mapeada (utils.almacen).
+Un solo barrido por proceso (`barrer_periodicamente`, iniciado al arrancar la
+app) revisa todas las sesiones; cada sesión sólo registra y cierra.
+Uso:
+    presupuesto.registrar(session.id, resultado)
+    tarea = asyncio.create_task(barrer_periodicamente())
+    presupuesto.uso()      # DataFrame con la memoria por sesión
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+from utils.resultado import compartidas
+
+# Límites configurables por variables de entorno, como EH_PROCESOS
+MEMORIA_SESION_MB = float(os.environ.get("EH_MEMORIA_SESION_MB", 64))
+MEMORIA_TOTAL_MB = float(os.environ.get("EH_MEMORIA_TOTAL_MB", 1024))
+INACTIVO_MIN = float(os.environ.get("EH_INACTIVO_MIN", 10))
+PERIODO_BARRIDO = 60  # Segundos entre barridos del proceso
+COMPARTIDAS = "compartidas"  # Grupo de las vistas compartidas entre sesiones
+
+MB = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class Presupuesto:
+    """Resultados por sesión (referencias débiles) y vistas compartidas con límites de memoria."""
+
+    def __init__(self, por_sesion: int, total: int, inactivo: float, compartidas=compartidas):
+        self.por_sesion = por_sesion
+        self.total = total
+        self.inactivo = inactivo
+        self.compartidas = compartidas
+        self.liberaciones = 0
+        self.bytes_liberados = 0
+        self._sesiones: dict[str, weakref.WeakSet] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, sesion: str, resultado):
+        """Agrega un resultado a la sesión; los anteriores salen solos al recolectarse."""
+        if resultado.empty:
+            return
+        with self._lock:
+            self._sesiones.setdefault(sesion, weakref.WeakSet()).add(resultado)
+
+    def cerrar(self, sesion: str):
+        with self._lock:
+            self._sesiones.pop(sesion, None)
+
+    def _grupos(self) -> list[tuple]:
+        """[(sesion, [vistas, ...]), ...] incluidas las compartidas."""
+        with self._lock:
+            grupos = [(s, list(conjunto)) for s, conjunto in self._sesiones.items()]
+        return grupos + [(COMPARTIDAS, self.compartidas())]
+
+    def _vivos(self) -> list[tuple]:
+        """[(sesion, vistas, bytes), ...] de lo que ocupa memoria."""
+        return [(s, v, tam) for s, vistas in self._grupos() for v in vistas if (tam := v.nbytes()) > 0]
+
+    def _soltar(self, vistas, motivo: str) -> int:
+        liberados = vistas.soltar()
+        if liberados:
+            with self._lock:
+                self.liberaciones += 1
+                self.bytes_liberados += liberados
+            logger.info("Vistas liberadas (%s): %.1f MB", motivo, liberados / MB)
+        return liberados
+
+    def barrer(self):
+        """Aplica los límites de inactividad, por sesión y global."""
+        ahora = time.monotonic()
+        vivos = []
+        for sesion, vistas, tam in self._vivos():
+            if ahora - vistas.ultimo_uso > self.inactivo:
+                self._soltar(vistas, "inactivo")
+            else:
+                vivos.append((sesion, vistas, tam))
+
+        # Del menos reciente al más reciente
+        vivos.sort(key=lambda v: v[1].ultimo_uso)
+        por_sesion = {}
+        for sesion, _, tam in vivos:
+            por_sesion[sesion] = por_sesion.get(sesion, 0) + tam
+        restantes = []
+        for sesion, vistas, tam in vivos:
+            if sesion != COMPARTIDAS and por_sesion[sesion] > self.por_sesion:
+                por_sesion[sesion] -= self._soltar(vistas, "límite de la sesión")
+            else:
+                restantes.append((vistas, tam))
+
+        total = sum(tam for _, tam in restantes)
+        for vistas, tam in restantes:
+            if total <= self.total:
+                break
+            total -= self._soltar(vistas, "límite global")
+
+    def uso(self) -> pd.DataFrame:
+        """Memoria por sesión (y de las vistas compartidas): objetos, MB en memoria e inactividad."""
+        ahora = time.monotonic()
+        filas = [
+            {
+                "Sesión": sesion[:11],
+                "Objetos": len(vistas),
+                "Memoria [MB]": sum(v.nbytes() for v in vistas) / MB,
+                "Inactivo [s]": min((ahora - v.ultimo_uso for v in vistas), default=0.0),
+            }
+            for sesion, vistas in self._grupos()
+        ]
+        return pd.DataFrame(filas, columns=["Sesión", "Objetos", "Memoria [MB]", "Inactivo [s]"])
+
+    def medidas(self) -> dict:
+        """Valores para utils.trazas.prometheus."""
+        vivos = self._vivos()
+        with self._lock:
+            sesiones = len(self._sesiones)
+        return {
+            "memoria_sesiones_bytes": sum(tam for s, _, tam in vivos if s != COMPARTIDAS),
+            "memoria_compartida_bytes": sum(tam for s, _, tam in vivos if s == COMPARTIDAS),
+            "sesiones": sesiones,
+            "vistas_liberadas_total": self.liberaciones,
+        }
+
+
+presupuesto = Presupuesto(int(MEMORIA_SESION_MB * MB), int(MEMORIA_TOTAL_MB * MB), INACTIVO_MIN * 60)
+
+
+async def barrer_periodicamente(periodo: float = PERIODO_BARRIDO):
+    """Barre todas las sesiones cada `periodo` segundos, fuera del event loop."""
+    while True:
+        await asyncio.sleep(periodo)
+        try:
+            await asyncio.to_thread(presupuesto.barrer)
+        except Exception:
+            logger.exception("Falló el barrido de memoria")
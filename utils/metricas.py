@@ -0,0 +1,71 @@
+# utils/metricas.py
+# -*- coding: utf-8 -*-
+"""
+Métricas de desempeño térmico de varios sistemas a la vez.
+Las temperaturas interiores de todos los sistemas de una corrida (misma
+malla de tiempo) llegan como un arreglo 2-D (sistema, tiempo) y cada métrica
+sale de una sola operación vectorizada sobre el eje del tiempo:
+    FD      amortiguamiento: rango de Ti / rango de Ta
+    FDsa    rango de Ti / rango de Tsa
+    TR      retraso del máximo de Ti respecto al de Ta ("HH:MM")
+    Timax   temperatura interior máxima [°C]
+    Hconf   horas con Ti dentro de la zona de confort Tn ± DeltaTn [h]
+    GHsup   grados-hora por encima de la zona de confort [°C·h]
+    GHinf   grados-hora por debajo de la zona de confort [°C·h]
+Uso:
+    m = calcular(Ti, Tsa_max, Tsa_min, Ta_max, Ta_min, indice, Ta_idxmax, Tn, DeltaTn, dt)
+    m["FD"][i]   # FD del sistema i
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+SEGUNDOS_DIA = 86_400
+
+
+def formato_tr(segundos: np.ndarray) -> list[str]:
+    """
+    Retrasos en segundos como "HH:MM". Los negativos dan la vuelta al día,
+    igual que Timedelta.components (-00:30 -> "23:30").
+    """
+    s = np.mod(np.floor(segundos).astype(np.int64), SEGUNDOS_DIA)
+    return [f"{h:02}:{m:02}" for h, m in zip(s // 3600, s % 3600 // 60)]
+
+
+def horas_tr(tr: str) -> float:
+    """Inverso de formato_tr: "HH:MM" como horas decimales."""
+    horas, minutos = tr.split(":")
+    return int(horas) + int(minutos) / 60
+
+
+def calcular(Ti, Tsa_max, Tsa_min, Ta_max: float, Ta_min: float, indice: pd.DatetimeIndex,
+             Ta_idxmax: pd.Timestamp, Tn: float, DeltaTn: float, dt: float) -> dict:
+    """
+    Métricas de los sistemas cuyas Ti son las filas de `Ti`, muestreadas en
+    `indice` cada `dt` segundos. Tsa_max y Tsa_min van por sistema; Ta y la
+    zona de confort son de la corrida. Regresa {métrica: arreglo por sistema},
+    salvo TR, que es una lista de cadenas.
+    """
+    Ti = np.atleast_2d(np.asarray(Ti, dtype=np.float64))
+    maximos = Ti.max(axis=1)
+    rango = maximos - Ti.min(axis=1)
+    posicion = Ti.argmax(axis=1)
+
+    # Retraso en segundos entre el máximo de cada Ti y el de Ta
+    tiempos = indice.asi8  # ns desde epoch, sin zona horaria de por medio
+    retraso = (tiempos[posicion] - Ta_idxmax.value) // 10**9
+
+    horas = dt / 3600
+    superior = Tn + DeltaTn
+    inferior = Tn - DeltaTn
+    return {
+        "FD": rango / (Ta_max - Ta_min),
+        "FDsa": rango / (np.asarray(Tsa_max, dtype=np.float64) - np.asarray(Tsa_min, dtype=np.float64)),
+        "TR": formato_tr(retraso),
+        "Timax": maximos,
+        "Hconf": ((Ti >= inferior) & (Ti <= superior)).sum(axis=1) * horas,
+        "GHsup": np.clip(Ti - superior, 0, None).sum(axis=1) * horas,
+        "GHinf": np.clip(inferior - Ti, 0, None).sum(axis=1) * horas,
+    }
@@ -0,0 +1,572 @@
+# utils/motor.py
+# -*- coding: utf-8 -*-
+"""
+Motor de simulación de sistemas constructivos.
+Cada sistema se describe con un diccionario (trabajo). La temperatura sol-aire
+se calcula en el proceso principal una sola vez por corrida y absortancia
+(utils.tsa) y a los procesos del pool sólo se envía el método de diferencias
+finitas (`resolver_temperatura`) con arreglos pequeños.
+La resolución (Nx) viaja en cada trabajo, nunca en eh.config, para que
+corridas simultáneas no se pisen; con Nx = "auto" se elige por convergencia.
+`resolver_sistemas` reparte una lista de trabajos en un pool de
+procesos y devuelve los resultados en el orden de sc_id;
+`resolver_sistemas_async` hace lo mismo sin bloquear el event loop.
+Antes de resolver, cada trabajo se busca en la caché de resultados
+compartida (utils.cache.resultados) por su `clave_resultado`.
+enerhabitat (con pvlib y scipy) se importa dentro de las funciones que lo
+usan, para que importar este módulo no retrase el arranque de la app.
+Uso:
+    from utils.motor import resolver_sistemas
+    resultados = resolver_sistemas(trabajos, avance=lambda r: ...)
+"""
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils import metricas, trazas
+from utils.cache import dia_promedio, dia_disponible, hash_epw, resultados as cache_resultados
+from utils.tsa import CapaTsa
+
+NX = 200  # Número de elementos de discretización por defecto
+
+# Resolución por corrida: Nx fijo o "auto" (el menor Nx que converge)
+RESOLUCIONES = {"rapido": 50, "preciso": NX, "auto": "auto"}
+NX_CANDIDATOS = (25, 50, 100, 200, 400)  # Nx que prueba el modo automático
+TOLERANCIA_NX = 0.01  # Cambio relativo máximo de FD y energía entre Nx sucesivos
+
+# Vista previa: sólo se reduce Nx; con dt mayores el solver se vuelve inestable
+NX_PREVIA = 25
+
+VERSION_RESULTADOS = 3  # Cambia cuando cambia el contenido de los resultados en caché
+
+# Materiales del editor y del solver; eh.config por sí solo lee "materials.ini"
+# relativo al directorio de trabajo
+MATERIALES_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "materials.ini")
+
+# Procesos para resolver sistemas en paralelo (1 = secuencial)
+MAX_PROCESOS = int(os.environ.get("EH_PROCESOS", os.cpu_count() or 1))
+
+# Lotes por proceso al repartir muchos sistemas (barridos)
+LOTES_POR_PROCESO = 4
+
+COLUMNAS_CLIMA = ["Tn", "DeltaTn", "Ta", "Ig", "Ib", "Id", "Is"]
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+_materiales_cargados = False
+
+
+def cargar_enerhabitat():
+    """
+    Importa enerhabitat y, la primera vez en cada proceso, apunta eh.config a
+    MATERIALES_INI, el mismo archivo que lista el editor (utils.card).
+    """
+    global _materiales_cargados
+    import enerhabitat as eh
+
+    if not _materiales_cargados:
+        eh.config.file = MATERIALES_INI
+        _materiales_cargados = True
+    return eh
+
+
+def get_pool():
+    """Pool de procesos compartido, creado al primer uso."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_PROCESOS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _descartar_pool(roto):
+    """Quita el pool roto; otro hilo pudo haberlo reemplazado ya."""
+    global _pool
+    with _pool_lock:
+        if _pool is roto:
+            _pool = None
+    roto.shutdown(wait=False, cancel_futures=True)
+
+
+async def _en_pool(funcion, *args):
+    """
+    Corre `funcion` en el pool compartido. Si un proceso murió (OOM, falla de
+    una biblioteca nativa) el pool queda roto para todos: se crea otro y se
+    reintenta una vez.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    try:
+        return await loop.run_in_executor(pool, funcion, *args)
+    except BrokenProcessPool:
+        logger.warning("El pool de procesos se rompió; se crea otro y se reintenta")
+        _descartar_pool(pool)
+        return await loop.run_in_executor(get_pool(), funcion, *args)
+
+
+def resolver_temperatura(Tsa, Tn: float, capas, aire: bool, Nx: int = NX, dt: int | None = None) -> dict:
+    """
+    Método de diferencias finitas de enerhabitat con los parámetros explícitos.
+    Tsa es la temperatura sol-aire muestreada cada `dt` segundos y Tn la
+    temperatura de neutralidad media (condición inicial y consigna de AC).
+
+    Regresa {Ti, ET} sin AC o {Ti, Qcool, Qheat} con AC.
+    Repite el ciclo privado de eh.System, por eso pyproject acota enerhabitat
+    a < 0.2 y benchmarks.verificar compara ambos (solver_paridad).
+    """
+    eh = cargar_enerhabitat()
+    from enerhabitat.ehtools import (
+        set_construction,
+        set_k_rhoc,
+        prepare_static_coefficients,
+        calculate_coefficients,
+        solve_PQ,
+        solve_PQ_AC,
+    )
+
+    dt = int(dt or eh.config.dt)
+    La = eh.config.La
+    ho = eh.config.ho
+    hi = eh.config.hi
+
+    cs = set_construction(eh.config.materials, list(capas))
+    k, rhoc, dx = set_k_rhoc(cs, Nx)
+    mass_coeff, a_static, b_static, c_static = prepare_static_coefficients(k, rhoc, dx, dt, ho, hi)
+
+    d = np.empty(Nx)
+    P = np.empty(Nx)
+    Q = np.empty(Nx)
+    Tn_aux = np.empty(Nx)
+    capacitance_factor = hi * dt / (eh.config.AIR_DENSITY * eh.config.AIR_HEAT_CAPACITY * La)
+
+    Tsa_vals = np.asarray(Tsa, dtype=np.float64)
+    n_steps = Tsa_vals.shape[0]
+    T = np.full(Nx, Tn)
+    Ti_vals = np.full(n_steps, Tn)
+    Ti_new = np.empty_like(Ti_vals)
+
+    C = 1
+    if aire:
+        while C > 5e-4:
+            Told = T.copy()
+            Qcool = Qheat = 0.
+            for idx in range(n_steps):
+                calculate_coefficients(mass_coeff, T, Tsa_vals[idx], ho, Ti_vals[idx], hi, d)
+                T, Ti = solve_PQ_AC(a_static, b_static, c_static, d, T, Nx, Ti_vals[idx], hi, La, dt)
+                if T[Nx - 1] > Ti:
+                    Qcool += hi * dt * (T[Nx - 1] - Ti)
+                if T[Nx - 1] < Ti:
+                    Qheat += hi * dt * (Ti - T[Nx - 1])
+                Ti_vals[idx] = Ti
+            C = abs(Told - T).mean()
+        return {"Ti": Ti_vals, "Qcool": Qcool, "Qheat": Qheat}
+
+    ET = 0.0
+    while C > 5e-4:
+        Told = T.copy()
+        ET_iter = 0.
+        for idx in range(n_steps):
+            tint_prev = Ti_vals[idx]
+            calculate_coefficients(mass_coeff, T, Tsa_vals[idx], ho, tint_prev, hi, d)
+            T, tint_new = solve_PQ(a_static, b_static, c_static, d, T, Nx, tint_prev, capacitance_factor, P, Q, Tn_aux)
+            Ti_new[idx] = tint_new
+            if T[Nx - 1] > tint_new:
+                ET_iter += hi * (T[Nx - 1] - tint_new) * dt
+        Ti_vals[:] = Ti_new
+        C = np.abs(Told - T).mean()
+        ET = ET_iter
+    return {"Ti": Ti_vals, "ET": ET}
+
+
+def _indicadores(solucion: dict) -> tuple:
+    """Lo que determina FD (rango de Ti), TR (posición del máximo) y la energía."""
+    Ti = solucion["Ti"]
+    energia = solucion["Qcool"] + solucion["Qheat"] if "Qcool" in solucion else solucion["ET"]
+    return Ti.max() - Ti.min(), int(Ti.argmax()), energia
+
+
+def _convergio(antes: tuple, ahora: tuple, tolerancia: float) -> bool:
+    def cerca(a, b):
+        return abs(a - b) <= tolerancia * max(abs(a), abs(b))
+
+    return antes[1] == ahora[1] and cerca(antes[0], ahora[0]) and cerca(antes[2], ahora[2])
+
+
+def resolver_convergente(Tsa, Tn: float, capas, aire: bool, dt: int | None = None,
+                         tolerancia: float = TOLERANCIA_NX) -> dict:
+    """
+    Resuelve con Nx crecientes (NX_CANDIDATOS) hasta que FD, TR y la energía
+    cambian menos que `tolerancia` respecto al Nx anterior.
+    Regresa la solución del último Nx con la llave "Nx".
+    """
+    anterior = None
+    for Nx in NX_CANDIDATOS:
+        solucion = resolver_temperatura(Tsa, Tn, capas, aire, Nx, dt)
+        actual = _indicadores(solucion)
+        if anterior is not None and _convergio(anterior, actual, tolerancia):
+            break
+        anterior = actual
+    solucion["Nx"] = Nx
+    return solucion
+
+
+def resolver_tarea(tarea: dict) -> dict:
+    """Resuelve una tarea con su Nx (o el automático) y registra Nx y tiempo."""
+    inicio = time.perf_counter()
+    if tarea["Nx"] == "auto":
+        solucion = resolver_convergente(**{k: v for k, v in tarea.items() if k != "Nx"})
+    else:
+        solucion = resolver_temperatura(**tarea)
+        solucion["Nx"] = tarea["Nx"]
+    solucion["tiempo"] = time.perf_counter() - inicio
+    return solucion
+
+
+def _resolver_lote(tareas: list[dict]) -> list[dict]:
+    """Punto de entrada de los procesos del pool: sólo recibe arreglos pequeños."""
+    return [resolver_tarea(tarea) for tarea in tareas]
+
+
+def _lotes(preparados: list[tuple]) -> list[list[tuple]]:
+    """
+    Agrupa los trabajos para el pool: uno por lote en corridas pequeñas y
+    varios por lote en barridos, para no pagar la comunicación entre
+    procesos por cada sistema.
+    """
+    tam = max(1, len(preparados) // (MAX_PROCESOS * LOTES_POR_PROCESO))
+    return [preparados[i:i + tam] for i in range(0, len(preparados), tam)]
+
+
+def _nx(trabajo: dict):
+    """Nx del trabajo: entero, "auto" o un modo de RESOLUCIONES."""
+    Nx = trabajo.get("Nx", NX)
+    Nx = RESOLUCIONES.get(Nx, Nx)
+    return Nx if Nx == "auto" else int(Nx)
+
+
+def _clave_corrida(trabajo: dict) -> tuple:
+    import enerhabitat as eh
+
+    return (
+        hash_epw(trabajo["epw"]),
+        str(trabajo["mes"]),
+        float(trabajo["tilt"]),
+        float(trabajo["azimuth"]),
+        int(trabajo.get("dt") or eh.config.dt),
+    )
+
+
+def _preparar(pendientes: list[tuple]) -> list[tuple]:
+    """
+    Calcula la capa de Tsa una vez por (EPW, mes, orientación) y, dentro de
+    ella, una vez por absortancia distinta para todos los sistemas a la vez.
+    Regresa [(clave, trabajo, corrida, tarea), ...].
+    """
+    corridas = {}
+    for _, trabajo in pendientes:
+        clave = _clave_corrida(trabajo)
+        if clave not in corridas:
+            _, dia_df = dia_promedio(trabajo["epw"], trabajo["mes"])
+            inicio = time.perf_counter()
+            capa = CapaTsa(dia_df, float(trabajo["tilt"]), float(trabajo["azimuth"]), clave[-1])
+            clima = dia_df[COLUMNAS_CLIMA[:-1]].iloc[::capa.dt].copy()
+            clima["Is"] = capa.Is[::capa.dt]
+            corridas[clave] = {"capa": capa, "clima": clima, "absortancias": set(), "tiempo": time.perf_counter() - inicio}
+        corridas[clave]["absortancias"].add(float(trabajo["absortancia"]))
+
+    # Una muestra de "tsa" por corrida: irradiancia sobre la superficie y Tsa de sus absortancias
+    for corrida in corridas.values():
+        inicio = time.perf_counter()
+        corrida["capa"].calcular(corrida["absortancias"])
+        trazas.registrar("tsa", corrida.pop("tiempo") + time.perf_counter() - inicio)
+
+    preparados = []
+    for clave, trabajo in pendientes:
+        corrida = corridas[_clave_corrida(trabajo)]
+        capa = corrida["capa"]
+        tarea = {
+            "Tsa": capa.muestreo(trabajo["absortancia"]),
+            "Tn": capa.Tn,
+            "capas": list(trabajo["capas"]),
+            "aire": bool(trabajo["aire"]),
+            "Nx": _nx(trabajo),
+            "dt": capa.dt,
+        }
+        preparados.append((clave, trabajo, corrida, tarea))
+    return preparados
+
+
+def _armar(terminados: list[tuple]) -> list[dict]:
+    """
+    Construye los resultados de [(trabajo, corrida, solucion), ...]. Las
+    métricas se calculan de una vez para todos los sistemas de cada corrida
+    (misma malla de tiempo) con utils.metricas.
+    """
+    grupos = {}
+    for i, (_, corrida, _) in enumerate(terminados):
+        grupos.setdefault(id(corrida), []).append(i)
+
+    resultados = [None] * len(terminados)
+    for posiciones in grupos.values():
+        corrida = terminados[posiciones[0]][1]
+        capa = corrida["capa"]
+        trabajos = [terminados[i][0] for i in posiciones]
+        soluciones = [terminados[i][2] for i in posiciones]
+        extremos = np.array([capa.extremos(float(t["absortancia"])) for t in trabajos])
+        with trazas.medir("metricas"):
+            calculadas = metricas.calcular(
+                np.stack([s["Ti"] for s in soluciones]),
+                extremos[:, 0],
+                extremos[:, 1],
+                capa.Ta_max,
+                capa.Ta_min,
+                capa.indice,
+                capa.Ta_idxmax,
+                capa.Tn,
+                capa.DeltaTn,
+                capa.dt,
+            )
+
+        for j, (i, trabajo, solucion) in enumerate(zip(posiciones, trabajos, soluciones)):
+            # El solver pudo correr en otro proceso: su tiempo viaja con la solución
+            trazas.registrar("solver", solucion["tiempo"])
+            m = {"Eenf": None, "Ecal": None, "Etotal": None, "ET": None}
+            if trabajo["aire"]:
+                Qcool = solucion["Qcool"]
+                Qheat = solucion["Qheat"]
+                m.update(Eenf=Qcool, Ecal=Qheat, Etotal=Qcool + Qheat)
+            else:
+                m["ET"] = solucion["ET"]
+            for clave, valores in calculadas.items():
+                m[clave] = valores[j] if clave == "TR" else float(valores[j])
+
+            solve_df = pd.DataFrame(
+                {"Tsa": capa.muestreo(float(trabajo["absortancia"])), "Ti": solucion["Ti"]},
+                index=capa.indice,
+            )
+            resultados[i] = {
+                "sc_id": trabajo["sc_id"],
+                "solucion": solve_df,
+                "clima": corrida["clima"],
+                "metricas": m,
+                "Nx": solucion["Nx"],
+                "tiempo": solucion["tiempo"],
+            }
+    return resultados
+
+
+def resolver_sistema(trabajo: dict) -> dict:
+    """
+    Resuelve un sistema constructivo.
+
+    trabajo = {
+        sc_id, epw, mes, tilt, azimuth, absortancia,
+        capas: [(material, ancho), ...],
+        aire: bool,
+        Nx: entero, "auto" o modo de RESOLUCIONES
+    }
+
+    Regresa {sc_id, solucion (Tsa, Ti), clima, metricas, Nx, tiempo}.
+    """
+    [(_, trabajo, corrida, tarea)] = _preparar([(None, trabajo)])
+    return _armar([(trabajo, corrida, resolver_tarea(tarea))])[0]
+
+
+def clave_resultado(trabajo: dict) -> str:
+    """
+    Clave de caché de un trabajo: todo lo que determina su solución
+    (EPW por contenido, fecha, orientación, absortancia, capas con sus
+    propiedades, modo de AC, Nx y el resto de la configuración de eh).
+    """
+    eh = cargar_enerhabitat()
+
+    materiales = eh.config.materials_dict()
+    config = eh.config.to_dict()
+    config.pop("Nx")
+    if _nx(trabajo) == "auto":
+        config["convergencia"] = [TOLERANCIA_NX, list(NX_CANDIDATOS)]
+    datos = {
+        "version": VERSION_RESULTADOS,
+        "epw": hash_epw(trabajo["epw"]),
+        "year": date.today().year,
+        "mes": str(trabajo["mes"]),
+        "tilt": float(trabajo["tilt"]),
+        "azimuth": float(trabajo["azimuth"]),
+        "absortancia": float(trabajo["absortancia"]),
+        "capas": [[m, float(ancho), materiales[m]] for m, ancho in trabajo["capas"]],
+        "aire": bool(trabajo["aire"]),
+        "Nx": _nx(trabajo),
+        "dt": int(trabajo.get("dt") or eh.config.dt),
+        "config": config,
+    }
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode()).hexdigest()
+
+
+def trabajos_previos(trabajos: list[dict]) -> list[dict]:
+    """
+    Copias de baja resolución (Nx = NX_PREVIA) para publicar una vista previa.
+    Regresa [] si no vale la pena: todos los trabajos ya están en caché o
+    ninguno usa un Nx mayor que el de la vista previa.
+    """
+    # Consultar aquí no es un uso: no cuenta en el hit rate ni mueve la LRU
+    if all(cache_resultados.contiene(clave_resultado(t)) for t in trabajos):
+        return []
+    if all(_nx(t) != "auto" and _nx(t) <= NX_PREVIA for t in trabajos):
+        return []
+    return [dict(t, Nx=NX_PREVIA) for t in trabajos]
+
+
+def _buscar_en_cache(trabajos: list[dict], usar_cache: bool = True):
+    """
+    Separa los trabajos ya resueltos de los pendientes.
+    Regresa (resultados, pendientes, repetidos); pendientes y repetidos son
+    [(clave, trabajo), ...] y los repetidos comparten clave con un pendiente,
+    así que se resuelven una sola vez. Con usar_cache=False todo queda pendiente.
+    """
+    resultados = []
+    pendientes = []
+    repetidos = []
+    claves_pendientes = set()
+    for trabajo in trabajos:
+        clave = clave_resultado(trabajo)
+        if clave in claves_pendientes:
+            repetidos.append((clave, trabajo))
+            continue
+        guardado = cache_resultados.get(clave) if usar_cache else None
+        if guardado is None:
+            pendientes.append((clave, trabajo))
+            claves_pendientes.add(clave)
+            continue
+        resultados.append(dict(guardado, sc_id=trabajo["sc_id"]))
+
+    if usar_cache:
+        logger.info(
+            "Caché de resultados: %d de %d sistemas reutilizados (hit rate %.0f %%)",
+            len(resultados), len(trabajos), 100 * cache_resultados.stats()["hit_rate_total"],
+        )
+    return resultados, pendientes, repetidos
+
+
+def _guardar_en_cache(clave: str, resultado: dict):
+    cache_resultados.put(clave, {k: v for k, v in resultado.items() if k != "sc_id"})
+
+
+def _completar_repetidos(repetidos: list[tuple], resueltos: dict, avance=None) -> list[dict]:
+    """Copia la solución de cada repetido desde el trabajo con la misma clave."""
+    copias = []
+    for clave, trabajo in repetidos:
+        resultado = dict(resueltos[clave], sc_id=trabajo["sc_id"])
+        copias.append(resultado)
+        if avance is not None:
+            avance(resultado)
+    return copias
+
+
+def resolver_sistemas(trabajos: list[dict], avance=None) -> list[dict]:
+    """
+    Resuelve una lista de trabajos, en paralelo si MAX_PROCESOS > 1.
+    `avance(resultado)` se llama cada vez que termina un sistema.
+    Los resultados se regresan ordenados por sc_id.
+    Corre `resolver_sistemas_async` en un event loop propio, así que no debe
+    llamarse desde código que ya corre en uno (ahí se usa la versión async).
+    """
+    return asyncio.run(resolver_sistemas_async(trabajos, avance))
+
+
+def _preparar_almacen(epw: str):
+    import enerhabitat as eh
+    from utils import almacen
+
+    try:
+        almacen.preparar_epw(hash_epw(epw), eh.Location(epw_file=epw))
+    except OSError:
+        pass  # Almacén de solo lectura: cada proceso calculará su mes igual
+
+
+def _precargar_dia(epw: str, mes: str) -> str:
+    """Punto de entrada del pool: calcula el meanDay y lo deja en el almacén."""
+    dia_promedio(epw, mes)
+    return mes
+
+
+async def precargar_dias_async(trabajos: list[dict]):
+    """
+    Calcula en paralelo los meanDay que usarán los trabajos (p. ej. los 12
+    meses de una corrida anual). Los procesos del pool los escriben en el
+    almacén y el proceso principal sólo los abre con memoria mapeada.
+    """
+    pares = list(dict.fromkeys((t["epw"], str(t["mes"])) for t in trabajos))
+    faltantes = [p for p in pares if not await asyncio.to_thread(dia_disponible, *p)]
+    if MAX_PROCESOS > 1 and len(faltantes) > 1:
+        # El meta.json se escribe aquí, una vez, para que los procesos sólo agreguen meses
+        for epw in dict.fromkeys(epw for epw, _ in faltantes):
+            await asyncio.to_thread(_preparar_almacen, epw)
+        await asyncio.gather(*(_en_pool(_precargar_dia, epw, mes) for epw, mes in faltantes))
+    for epw, mes in pares:
+        await asyncio.to_thread(dia_promedio, epw, mes)
+
+
+async def resolver_sistemas_async(trabajos: list[dict], avance=None, usar_cache: bool = True) -> list[dict]:
+    """
+    Implementación de `resolver_sistemas` (caché, repetidos, lotes y guardado):
+    el cálculo corre en el pool de procesos (o en un hilo si MAX_PROCESOS = 1)
+    y `avance` se llama desde el event loop. Si la tarea se cancela, los
+    sistemas pendientes no se resuelven. Con usar_cache=False (vista previa)
+    no se consulta ni se llena la caché de resultados.
+    """
+    resultados, pendientes, repetidos = await asyncio.to_thread(_buscar_en_cache, trabajos, usar_cache)
+    if avance is not None:
+        for resultado in resultados:
+            avance(resultado)
+    preparados = await asyncio.to_thread(_preparar, pendientes)
+    resueltos = {}
+
+    def _terminar(lote, soluciones):
+        armados = _armar([(trabajo, corrida, solucion) for (_, trabajo, corrida, _), solucion in zip(lote, soluciones)])
+        for (clave, *_), resultado in zip(lote, armados):
+            if usar_cache:
+                _guardar_en_cache(clave, resultado)
+            resueltos[clave] = resultado
+            resultados.append(resultado)
+            if avance is not None:
+                avance(resultado)
+
+    if MAX_PROCESOS > 1 and len(preparados) > 1:
+        async def _resolver(lote):
+            soluciones = await _en_pool(_resolver_lote, [p[3] for p in lote])
+            return lote, soluciones
+
+        futuros = [asyncio.ensure_future(_resolver(lote)) for lote in _lotes(preparados)]
+        try:
+            for siguiente in asyncio.as_completed(futuros):
+                _terminar(*await siguiente)
+        except asyncio.CancelledError:
+            for futuro in futuros:
+                futuro.cancel()
+            raise
+    else:
+        for preparado in preparados:
+            _terminar([preparado], [await asyncio.to_thread(resolver_tarea, preparado[3])])
+
+    resultados += _completar_repetidos(repetidos, resueltos, avance)
+    return sorted(resultados, key=lambda r: r["sc_id"])
@@ -0,0 +1,225 @@
+# utils/resultado.py
+# -*- coding: utf-8 -*-
+"""
+Resultados inmutables con vistas memorizadas.
+`Resultado` se crea una vez por cálculo y reúne las series (float64, de
+solo lectura), la tabla de métricas, el modo de AC y si es una vista previa.
+Tablas redondeadas y pirámides para las gráficas se calculan la primera vez
+que se piden y se reutilizan; ningún consumidor copia los datos. Las
+descargas se generan por bloques a partir de la tabla (utils.exportar).
+`vistas_compartidas(df)` da las mismas vistas para un DataFrame que se
+comparte entre sesiones (el meanDay de utils.cache).
+`pagina()` recorta en el servidor la ventana visible de la tabla (agregada,
+filtrada y ordenada) para que el DataGrid no reciba las 86,400 filas.
+`soltar()` libera las vistas memorizadas cuando el presupuesto de memoria
+lo pide (ver utils.memoria); la tabla nunca se reemplaza.
+Uso:
+    resultado = Resultado(tabla, metricas, aire=True, metadatos=metadatos(trabajos, resultados))
+    resultado.redondeada()     # DataFrame con "Time" para el DataGrid
+    datos, total, numero = pagina(resultado.agregada("1min"), numero=2)
+"""
+
+from __future__ import annotations
+import mmap
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache, MAX_DIAS_PROMEDIO
+from utils.graficas import Piramide
+
+INTERVALO_BASE = "1s"  # Paso de las series del motor
+FILAS_PAGINA = 100  # Filas por página del DataGrid
+
+
+def _en_memoria(arreglo: np.ndarray) -> int:
+    """Bytes del arreglo en el heap; 0 si está respaldado por un archivo mapeado."""
+    base = arreglo
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return 0
+        base = getattr(base, "base", None)
+    return arreglo.nbytes
+
+
+def tamano(objeto) -> int:
+    """Bytes aproximados en memoria de tablas, arreglos, vistas y pirámides."""
+    if isinstance(objeto, Vistas):
+        return objeto.nbytes()
+    if isinstance(objeto, pd.DataFrame):
+        total = objeto.index.nbytes
+        for i in range(objeto.shape[1]):
+            serie = objeto.iloc[:, i]
+            valores = serie.to_numpy()
+            total += serie.memory_usage(index=False, deep=True) if valores.dtype == object else _en_memoria(valores)
+        return total
+    if isinstance(objeto, np.ndarray):
+        return _en_memoria(objeto)
+    if isinstance(objeto, Piramide):
+        return tamano(objeto.niveles)
+    if isinstance(objeto, dict):
+        return sum(tamano(v) for v in objeto.values())
+    if isinstance(objeto, (list, tuple)):
+        return sum(tamano(v) for v in objeto)
+    return 0
+
+
+def compactar(tabla: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnas numéricas en float64 de solo lectura, sin consolidar en bloques.
+    Se conserva la precisión del motor: Parquet y Feather exportan sin redondear
+    y una serie de dt = 600 s son 144 filas, así que float32 no ahorraba casi nada.
+    """
+    columnas = {}
+    for columna in tabla.columns:
+        valores = tabla[columna].to_numpy()
+        if np.issubdtype(valores.dtype, np.floating):
+            valores = np.ascontiguousarray(valores, dtype=np.float64)
+        valores.flags.writeable = False
+        columnas[columna] = valores
+    return pd.DataFrame(columnas, index=tabla.index, copy=False)
+
+
+class Vistas:
+    """Vistas derivadas de una tabla que no se modifica, memorizadas al primer uso."""
+
+    def __init__(self, tabla: pd.DataFrame):
+        self._tabla = tabla
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.ultimo_uso = time.monotonic()
+
+    @property
+    def tabla(self) -> pd.DataFrame:
+        self.ultimo_uso = time.monotonic()
+        return self._tabla
+
+    @property
+    def empty(self) -> bool:
+        return self._tabla.empty
+
+    def _vista(self, clave, crear):
+        with self._lock:
+            self.ultimo_uso = time.monotonic()
+            if clave not in self._memo:
+                self._memo[clave] = crear()
+            return self._memo[clave]
+
+    def nbytes(self) -> int:
+        """Memoria que ocupan la tabla y sus vistas memorizadas (sin lo mapeado de disco)."""
+        with self._lock:
+            memo = list(self._memo.values())
+        return tamano(self._tabla) + tamano(memo)
+
+    def soltar(self) -> int:
+        """
+        Suelta las vistas memorizadas; se recalculan al pedirlas. La tabla no
+        se toca, así que quien ya tiene una vista o la tabla sigue usándola.
+        Regresa los bytes liberados.
+        """
+        with self._lock:
+            memo = list(self._memo.values())
+            self._memo.clear()
+        return tamano(memo)
+
+    def redondeada(self, columnas=None, decimales: int = 2) -> pd.DataFrame:
+        """Tabla redondeada con la hora al inicio."""
+        columnas = tuple(columnas or self.tabla.columns)
+
+        def crear():
+            datos = self.tabla[list(columnas)].round(decimales)
+            datos.insert(0, "Time", datos.index)
+            return datos
+
+        return self._vista(("redondeada", columnas, decimales), crear)
+
+    def piramide(self, columnas) -> Piramide:
+        columnas = tuple(columnas)
+        return self._vista(("piramide", columnas), lambda: Piramide(self.tabla, columnas))
+
+    def agregada(self, intervalo: str = INTERVALO_BASE) -> Vistas:
+        """
+        Vistas de la tabla promediada cada `intervalo` ("1min", "1h"...). Los
+        intervalos sin datos (más finos que el paso de la serie) se omiten.
+        """
+        if intervalo == INTERVALO_BASE or self.empty:
+            return self
+        return self._vista(
+            ("agregada", intervalo),
+            lambda: Vistas(self.tabla.resample(intervalo).mean().dropna(how="all")),
+        )
+
+    def orden(self, columna: str = "Time", descendente: bool = False) -> np.ndarray:
+        """Posiciones de las filas ordenadas por `columna` ("Time" es el índice)."""
+        def crear():
+            if columna == "Time":
+                posiciones = np.arange(len(self.tabla))
+            else:
+                posiciones = np.argsort(self.tabla[columna].to_numpy(), kind="stable")
+            posiciones = posiciones[::-1] if descendente else posiciones
+            posiciones.flags.writeable = False
+            return posiciones
+
+        return self._vista(("orden", columna, descendente), crear)
+
+
+class Resultado(Vistas):
+    """
+    Resultado de un cálculo: series compactas, métricas, modo de AC, si es
+    provisional y los parámetros de la corrida (para las descargas).
+    """
+
+    def __init__(self, tabla: pd.DataFrame | None = None, metricas: pd.DataFrame | None = None,
+                 aire: bool | None = None, provisional: bool = False, metadatos: dict | None = None):
+        super().__init__(pd.DataFrame() if tabla is None else compactar(tabla))
+        self.metricas = pd.DataFrame() if metricas is None else metricas
+        self.aire = aire
+        self.provisional = provisional
+        self.metadatos = metadatos or {}
+
+
+def pagina(vistas: Vistas, columnas=None, orden: str = "Time", descendente: bool = False,
+           filtro: str | None = None, minimo: float | None = None, maximo: float | None = None,
+           numero: int = 1, filas: int = FILAS_PAGINA) -> tuple[pd.DataFrame, int, int]:
+    """
+    Página `numero` (desde 1) de la tabla redondeada, ordenada por `orden` y con
+    sólo las filas cuyo valor de `filtro` está entre `minimo` y `maximo`.
+    Regresa (filas de la página, filas que pasan el filtro, número de página
+    ajustado al rango válido).
+    """
+    tabla = vistas.redondeada(columnas)
+    posiciones = vistas.orden(orden, descendente)
+    if filtro and (minimo is not None or maximo is not None):
+        valores = tabla[filtro].to_numpy()
+        pasa = np.ones(len(valores), dtype=bool)
+        if minimo is not None:
+            pasa &= valores >= minimo
+        if maximo is not None:
+            pasa &= valores <= maximo
+        posiciones = posiciones[pasa[posiciones]]
+
+    total = len(posiciones)
+    paginas = max(-(-total // filas), 1)
+    numero = min(max(int(numero or 1), 1), paginas)
+    inicio = (numero - 1) * filas
+    return tabla.iloc[posiciones[inicio:inicio + filas]], total, numero
+
+
+# Vistas de DataFrames compartidos entre sesiones, por identidad del objeto.
+# La LRU guarda el DataFrame, así que su id no se reutiliza mientras esté aquí.
+_compartidas = LRUCache(MAX_DIAS_PROMEDIO)
+
+
+def compartidas() -> list[Vistas]:
+    """Las vistas compartidas vigentes, para el presupuesto de memoria."""
+    return _compartidas.valores()
+
+
+def vistas_compartidas(df: pd.DataFrame) -> Vistas:
+    vistas = _compartidas.get(id(df))
+    if vistas is None or vistas.tabla is not df:
+        vistas = Vistas(df)
+        _compartidas.put(id(df), vistas)
+    return vistas
@@ -0,0 +1,151 @@
+# utils/trazas.py
+# -*- coding: utf-8 -*-
+"""
+Tiempos por etapa del cálculo (EPW, meanDay, Tsa, solver, métricas, gráficas)
+acumulados en histogramas de latencia del proceso. Se exponen en formato
+Prometheus (GET /metrics, utils.api) y en el panel de diagnóstico de la app
+(EH_DEBUG=1), junto con el commit de la app.
+Las etapas que corren en los procesos del pool no se miden allá: el solver
+regresa su propio tiempo y el proceso principal lo registra.
+Uso:
+    with trazas.medir("tsa"):
+        capa.calcular(absortancias)
+    trazas.registrar("solver", solucion["tiempo"])
+"""
+
+from __future__ import annotations
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from utils.extraer import get_git_info
+
+# Límites superiores de las cubetas de los histogramas [s]
+CUBETAS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIJO = "enerhabitat"
+
+
+class Histograma:
+    """Conteos por cubeta, suma y máximo de las duraciones de una etapa."""
+
+    def __init__(self):
+        self.conteos = [0] * (len(CUBETAS) + 1)  # La última cubeta es +Inf
+        self.total = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos: float):
+        self.conteos[bisect.bisect_left(CUBETAS, segundos)] += 1
+        self.total += 1
+        self.suma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def cuantil(self, q: float) -> float:
+        """Cuantil aproximado: límite superior de la cubeta donde cae (como histogram_quantile)."""
+        objetivo = q * self.total
+        acumulado = 0
+        for limite, conteo in zip(CUBETAS, self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+
+_etapas: dict[str, Histograma] = {}
+_lock = threading.Lock()
+_build: tuple[str, str] | None = None
+
+
+def registrar(etapa: str, segundos: float):
+    with _lock:
+        histograma = _etapas.get(etapa)
+        if histograma is None:
+            histograma = _etapas[etapa] = Histograma()
+        histograma.observar(segundos)
+
+
+@contextmanager
+def medir(etapa: str):
+    """Mide el bloque (o la función, usado como decorador) y lo registra en `etapa`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(etapa, time.perf_counter() - inicio)
+
+
+def build() -> tuple[str, str]:
+    """(commit, rama) de la app, leídos una sola vez."""
+    global _build
+    if _build is None:
+        _build = get_git_info(short=True)
+    return _build
+
+
+def reiniciar():
+    with _lock:
+        _etapas.clear()
+
+
+def resumen() -> pd.DataFrame:
+    """Una fila por etapa con conteo y latencias [ms], para el panel de diagnóstico."""
+    with _lock:
+        filas = [
+            {
+                "Etapa": etapa,
+                "N": h.total,
+                "Media [ms]": 1e3 * h.suma / h.total,
+                "p50 [ms]": 1e3 * h.cuantil(0.5),
+                "p95 [ms]": 1e3 * h.cuantil(0.95),
+                "Máx [ms]": 1e3 * h.maximo,
+                "Total [s]": h.suma,
+            }
+            for etapa, h in sorted(_etapas.items())
+        ]
+    return pd.DataFrame(filas, columns=["Etapa", "N", "Media [ms]", "p50 [ms]", "p95 [ms]", "Máx [ms]", "Total [s]"])
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor))
+
+
+def prometheus(caches: dict | None = None, medidas: dict | None = None) -> str:
+    """
+    Texto en formato de exposición de Prometheus: el histograma de cada
+    etapa, la información del build y, si se pasan, los contadores de las
+    cachés ({nombre: stats()} como los de utils.cache.estadisticas) y otras
+    medidas sueltas ({nombre: valor}; las que terminan en _total son contadores).
+    """
+    commit, rama = build()
+    lineas = [
+        f"# HELP {PREFIJO}_build_info Commit y rama de la app.",
+        f"# TYPE {PREFIJO}_build_info gauge",
+        f'{PREFIJO}_build_info{{commit="{commit}",rama="{rama}"}} 1',
+        f"# HELP {PREFIJO}_etapa_segundos Duración de cada etapa del cálculo.",
+        f"# TYPE {PREFIJO}_etapa_segundos histogram",
+    ]
+    with _lock:
+        for etapa, h in sorted(_etapas.items()):
+            acumulado = 0
+            for limite, conteo in zip((*map(_numero, CUBETAS), "+Inf"), h.conteos):
+                acumulado += conteo
+                lineas.append(f'{PREFIJO}_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{PREFIJO}_etapa_segundos_sum{{etapa="{etapa}"}} {_numero(h.suma)}')
+            lineas.append(f'{PREFIJO}_etapa_segundos_count{{etapa="{etapa}"}} {h.total}')
+
+    if caches:
+        for contador, llave in (("aciertos", "hits"), ("fallos", "misses")):
+            lineas.append(f"# TYPE {PREFIJO}_cache_{contador}_total counter")
+            for nombre, stats in caches.items():
+                lineas.append(f'{PREFIJO}_cache_{contador}_total{{cache="{nombre}"}} {stats[llave]}')
+        lineas.append(f"# TYPE {PREFIJO}_cache_entradas gauge")
+        for nombre, stats in caches.items():
+            lineas.append(f'{PREFIJO}_cache_entradas{{cache="{nombre}"}} {stats["size"]}')
+    for nombre, valor in (medidas or {}).items():
+        tipo = "counter" if nombre.endswith("_total") else "gauge"
+        lineas.append(f"# TYPE {PREFIJO}_{nombre} {tipo}")
+        lineas.append(f"{PREFIJO}_{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
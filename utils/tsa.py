@@ -0,0 +1,94 @@
+# utils/tsa.py
+# -*- coding: utf-8 -*-
+"""
+Temperatura sol-aire compartida entre sistemas constructivos.
+    Tsa = Ta + a·Is/ho - LWR
+sólo depende del día promedio, la orientación (tilt, azimuth) y la absortancia,
+así que en una corrida se calcula una vez por absortancia distinta, todas a la
+vez como un arreglo 2-D, y se reparte a cada sistema.
+Uso:
+    capa = CapaTsa(dia_df, tilt, azimuth, dt)
+    capa.calcular([0.8, 0.3])
+    capa.muestreo(0.8)   # Tsa en la malla de tiempo del solver
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+BLOQUE_ABSORTANCIAS = 64  # Absortancias por bloque al vectorizar (acota la memoria)
+
+
+def irradiancia_superficie(dia_df: pd.DataFrame, tilt: float, azimuth: float) -> np.ndarray:
+    """Irradiancia total sobre la superficie (Is) para cada segundo del día promedio."""
+    import pvlib  # Medio segundo de importación; sólo hace falta al calcular
+
+    total = pvlib.irradiance.get_total_irradiance(
+        surface_tilt=tilt,
+        surface_azimuth=azimuth,
+        dni=dia_df["Ib"],
+        ghi=dia_df["Ig"],
+        dhi=dia_df["Id"],
+        solar_zenith=dia_df["zenith"],
+        solar_azimuth=dia_df["azimuth"],
+    )
+    return total.poa_global.to_numpy(dtype=np.float64)
+
+
+def radiacion_onda_larga(tilt: float) -> float:
+    """Corrección por radiación de onda larga: sólo para techos (tilt = 0)."""
+    return 3.9 if tilt == 0 else 0.0
+
+
+def temperatura_sol_aire(Ta: np.ndarray, Is: np.ndarray, absortancias, tilt: float) -> np.ndarray:
+    """Tsa para varias absortancias a la vez. Regresa un arreglo (tiempo, absortancia)."""
+    import enerhabitat as eh
+
+    a = np.asarray(absortancias, dtype=np.float64)
+    return Ta[:, None] + Is[:, None] * a[None, :] / eh.config.ho - radiacion_onda_larga(tilt)
+
+
+class CapaTsa:
+    """
+    Tsa de una corrida (EPW, mes, tilt, azimuth). Guarda por absortancia la serie
+    muestreada cada `dt` segundos, que es lo que usa el solver, y sus extremos
+    sobre el día completo, que es lo que usan las métricas.
+    """
+
+    def __init__(self, dia_df: pd.DataFrame, tilt: float, azimuth: float, dt: int):
+        self.tilt = tilt
+        self.azimuth = azimuth
+        self.dt = int(dt)
+        self.Ta = dia_df["Ta"].to_numpy(dtype=np.float64)
+        self.Is = irradiancia_superficie(dia_df, tilt, azimuth)
+        self.indice = dia_df.index[::self.dt]
+        self.Tn = float(dia_df["Tn"].mean())
+        self.DeltaTn = float(dia_df["DeltaTn"].mean())
+        self.Ta_max = float(self.Ta.max())
+        self.Ta_min = float(self.Ta.min())
+        self.Ta_idxmax = dia_df.index[int(self.Ta.argmax())]
+        self._tsa: dict[float, dict] = {}
+
+    def calcular(self, absortancias):
+        """Calcula, en bloques vectorizados, las absortancias que aún no tiene."""
+        nuevas = sorted({float(a) for a in absortancias} - self._tsa.keys())
+        for i in range(0, len(nuevas), BLOQUE_ABSORTANCIAS):
+            bloque = nuevas[i:i + BLOQUE_ABSORTANCIAS]
+            Tsa = temperatura_sol_aire(self.Ta, self.Is, bloque, self.tilt)
+            muestreo = Tsa[::self.dt]
+            maximos = Tsa.max(axis=0)
+            minimos = Tsa.min(axis=0)
+            for j, a in enumerate(bloque):
+                self._tsa[a] = {
+                    "muestreo": np.ascontiguousarray(muestreo[:, j]),
+                    "max": float(maximos[j]),
+                    "min": float(minimos[j]),
+                }
+
+    def muestreo(self, absortancia: float) -> np.ndarray:
+        return self._tsa[float(absortancia)]["muestreo"]
+
+    def extremos(self, absortancia: float) -> tuple[float, float]:
+        datos = self._tsa[float(absortancia)]
+        return datos["max"], datos["min"]